@@ -0,0 +1,198 @@
+"""
+Offline benchmark for the VoteInfo hot path
+
+Drives a vote through stub Discord objects (no network needed):
+start_vote, a reaction storm of N users x M options, add_voting_option and stop_vote,
+and reports events/sec, edits issued, listener latency and peak memory.
+
+Usage: python benchmarks/voteinfo_bench.py --users 1000 --options 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from typing import Dict, List
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movie_night.voteinfo import VoteInfo
+
+_ids = itertools.count(1)
+
+class StubMessage:
+    """Stands in for discord.Message, counting the API calls made on it"""
+    def __init__(self, channel:"StubChannel", content:str):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.reactions = []
+    
+    async def edit(self, content:str=None, **kwargs) -> None:
+        await self.channel.api_call()
+        self.channel.edits += 1
+        self.content = content
+    
+    async def add_reaction(self, emoji:str) -> None:
+        await self.channel.api_call()
+        self.channel.reactions_added += 1
+    
+    async def pin(self) -> None:
+        await self.channel.api_call()
+    
+    async def unpin(self) -> None:
+        await self.channel.api_call()
+
+class StubChannel:
+    """Stands in for both a discord.TextChannel and a commands.Context, since VoteInfo only needs send()"""
+    def __init__(self, api_latency:float):
+        self.id = next(_ids)
+        self.api_latency = api_latency
+        self.sends = 0
+        self.edits = 0
+        self.reactions_added = 0
+    
+    @property
+    def channel(self) -> "StubChannel":
+        return self
+    
+    async def send(self, content:str=None, **kwargs) -> StubMessage:
+        await self.api_call()
+        self.sends += 1
+        return StubMessage(self, content)
+    
+    async def api_call(self) -> None:
+        # Yield to the event loop like a real request would, even with no simulated latency
+        await asyncio.sleep(self.api_latency)
+
+class StubReactionEvent:
+    """Stands in for discord.RawReactionActionEvent"""
+    def __init__(self, message_id:int, channel_id:int, user_id:int, emoji:str, event_type:str):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.guild_id = 1
+        self.user_id = user_id
+        self.emoji = discord.PartialEmoji(name=emoji)
+        self.event_type = event_type
+
+def percentile(values:List[float], pct:float) -> float:
+    if len(values) == 0:
+        return 0.0
+    
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_benchmark(args:argparse.Namespace) -> Dict:
+    rng = random.Random(args.seed)
+    channel = StubChannel(args.api_latency)
+    
+    vinfo = VoteInfo(render_interval=args.render_interval, reaction_spacing=args.reaction_spacing)
+    titles = [f"Movie {i}" for i in range(args.options)]
+    
+    tracemalloc.start()
+    started = time.perf_counter()
+    
+    await vinfo.start_vote(titles, channel)
+    start_vote_time = time.perf_counter() - started
+    
+    # Every user votes for a random selection of options, and takes some of those votes back
+    events = []
+    for uid in range(1, args.users + 1):
+        for option in range(args.options):
+            if rng.random() < args.vote_ratio:
+                events.append(("add", uid, option))
+                if rng.random() < args.remove_ratio:
+                    events.append(("remove", uid, option))
+    
+    rng.shuffle(events)
+    
+    latencies = []
+    add_option_times = []
+    add_option_at = set(rng.sample(range(len(events)), min(args.added_options, len(events))))
+    
+    storm_started = time.perf_counter()
+    for i, (event_type, uid, option) in enumerate(events):
+        if i in add_option_at:
+            option_started = time.perf_counter()
+            await vinfo.add_voting_option(f"Added Movie {i}")
+            add_option_times.append(time.perf_counter() - option_started)
+        
+        shard, offset = vinfo._routes[option]
+        event = StubReactionEvent(shard.msg.id, channel.id, uid, VoteInfo.gen_alpha_emoji(offset), event_type.upper())
+        
+        event_started = time.perf_counter()
+        if event_type == "add":
+            await vinfo.reaction_add_listener(event)
+        else:
+            await vinfo.reaction_remove_listener(event)
+        latencies.append(time.perf_counter() - event_started)
+        
+        # Let the render scheduler (and any simulated API calls) run, like the gateway would between events
+        if i % args.batch_size == 0:
+            await asyncio.sleep(0)
+    
+    storm_time = time.perf_counter() - storm_started
+    
+    stop_started = time.perf_counter()
+    await vinfo.stop_vote(channel)
+    stop_vote_time = time.perf_counter() - stop_started
+    
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "users": args.users,
+        "options": args.options,
+        "events": len(events),
+        "events_per_sec": len(events) / storm_time if storm_time > 0 else 0.0,
+        "edits_issued": channel.edits,
+        "messages_sent": channel.sends,
+        "reactions_added": channel.reactions_added,
+        "render_stats": vinfo.get_render_stats(),
+        "seed_stats": vinfo.get_seed_stats(),
+        "listener_latency_p50_us": percentile(latencies, 50) * 1e6,
+        "listener_latency_p99_us": percentile(latencies, 99) * 1e6,
+        "start_vote_ms": start_vote_time * 1e3,
+        "add_voting_option_ms": (sum(add_option_times) / len(add_option_times) * 1e3) if add_option_times else 0.0,
+        "stop_vote_ms": stop_vote_time * 1e3,
+        "peak_memory_kib": peak_memory / 1024.0
+    }
+
+def parse_args(argv:List[str]=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the VoteInfo hot path")
+    parser.add_argument("--users", type=int, default=1000, help="number of voters")
+    parser.add_argument("--options", type=int, default=20, help="number of options in the vote")
+    parser.add_argument("--vote-ratio", type=float, default=0.5, help="chance a user votes for any given option")
+    parser.add_argument("--remove-ratio", type=float, default=0.1, help="chance a vote is taken back afterwards")
+    parser.add_argument("--added-options", type=int, default=2, help="options added with add_voting_option mid-vote")
+    parser.add_argument("--render-interval", type=float, default=1.5, help="VoteInfo render interval, in seconds")
+    parser.add_argument("--reaction-spacing", type=float, default=0.0, help="VoteInfo spacing between the bot's own reactions, in seconds")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated latency of each Discord API call, in seconds")
+    parser.add_argument("--batch-size", type=int, default=50, help="events dispatched between yields to the event loop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser.parse_args(argv)
+
+def main(argv:List[str]=None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmark(args))
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"{key:>28}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+from typing import Any, List
+
+from .profiler import profiled
+
+log = logging.getLogger("red.mogs.movie_night")
+
+class BufferedWriter:
+    """
+    Base for anything that keeps changes in memory and writes them out in batches from a background task,
+    subclasses write a batch in flush(), and in _write_now() when the event loop can't be waited on
+    """
+    def __init__(self, flush_interval:float, description:str):
+        self.flush_interval = flush_interval
+        
+        self._description = description # what's being written, for the log
+        self._pending = []              # changes not written yet, in the order they happened
+        self._lock = asyncio.Lock()
+        self._task = None
+    
+    async def flush(self) -> None:
+        raise NotImplementedError
+    
+    def flush_now(self) -> None:
+        """Writes out the buffered changes right away, blocking until they're written (ie. when the cog is unloading)"""
+        if self._task is not None:
+            self._task.cancel()
+        
+        changes, self._pending = self._pending, []
+        if len(changes) > 0:
+            self._write_now(changes)
+    
+    """ Private methods """
+    
+    def _buffer(self, change:Any) -> None:
+        self._pending.append(change)
+        
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+    
+    @profiled
+    async def _run(self) -> None:
+        # One batch per interval, for as long as changes keep being buffered
+        while len(self._pending) > 0:
+            await asyncio.sleep(self.flush_interval)
+            
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to write %s", self._description)
+                return
+    
+    def _write_now(self, changes:List[Any]) -> None:
+        raise NotImplementedError
@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import logging
+import re
+import time
+
+from croniter import croniter
+from datetime import datetime
+from dateutil import tz
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger("red.mogs.movie_night")
+
+_duration_re = re.compile(r"(\d+)\s*([dhms])")
+_duration_units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+
+def parse_duration(text:str) -> Optional[float]:
+    """Parses a duration like "90m" or "1h30m" into seconds, returns None if it isn't one"""
+    text = text.strip().lower()
+    parts = _duration_re.findall(text)
+    if len(parts) == 0 or _duration_re.sub("", text).strip() != "":
+        return None
+    
+    return float(sum(int(amount) * _duration_units[unit] for amount, unit in parts))
+
+def next_cron_time(cron:str, timezone_str:str) -> float:
+    """Returns the next time (as a unix timestamp) the cron expression fires in the given timezone"""
+    timezone = tz.gettz(timezone_str)
+    if timezone is None:
+        raise ValueError(f"Unknown timezone: {timezone_str}")
+    
+    if not croniter.is_valid(cron):
+        raise ValueError(f"Invalid cron expression: {cron}")
+    
+    return croniter(cron, datetime.now(timezone)).get_next(datetime).timestamp()
+
+class DeadlineScheduler:
+    """
+    Fires a callback for each guild when its deadline (a unix timestamp) passes,
+    every guild shares one heap and one task that sleeps until the earliest deadline
+    """
+    def __init__(self, callback:Callable[[int], Awaitable[None]]):
+        self._callback = callback
+        
+        self._heap = []         # (deadline, guild id), including ones that were changed or cancelled since
+        self._deadlines = {}    # guild id -> current deadline
+        self._wake = asyncio.Event()
+        self._task = None
+    
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+    
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        
+        self._task = None
+    
+    def schedule(self, guild_id:int, deadline:float) -> None:
+        """Sets (or replaces) a guild's deadline"""
+        self._deadlines[guild_id] = deadline
+        heapq.heappush(self._heap, (deadline, guild_id))
+        
+        # Only the earliest deadline matters to the sleeping task
+        if self._heap[0] == (deadline, guild_id):
+            self._wake.set()
+    
+    def cancel(self, guild_id:int) -> None:
+        # The heap entry is skipped once it comes up, there's no need to wake the task for it
+        self._deadlines.pop(guild_id, None)
+    
+    def get(self, guild_id:int) -> Optional[float]:
+        return self._deadlines.get(guild_id)
+    
+    def __len__(self) -> int:
+        return len(self._deadlines)
+    
+    """ Private methods """
+    
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            self._drop_stale()
+            
+            timeout = None
+            if len(self._heap) > 0:
+                timeout = self._heap[0][0] - time.time()
+            
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                
+                continue
+            
+            deadline, guild_id = heapq.heappop(self._heap)
+            del self._deadlines[guild_id]
+            
+            # Each guild is handled on its own, so a slow or failing one doesn't hold up the rest
+            asyncio.ensure_future(self._fire(guild_id))
+    
+    async def _fire(self, guild_id:int) -> None:
+        try:
+            await self._callback(guild_id)
+        except Exception:
+            log.exception("Failed to handle the deadline for guild %s", guild_id)
+    
+    def _drop_stale(self) -> None:
+        # Skip past deadlines that were changed or cancelled after being pushed
+        while len(self._heap) > 0 and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import os
+
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from .buffered import BufferedWriter
+
+log = logging.getLogger("red.mogs.movie_night")
+
+class VoteEventLog(BufferedWriter):
+    """
+    Append-only log of a guild's vote events, kept on disk next to a snapshot of the vote,
+    events are buffered and written in the background, and once enough pile up they're compacted into a new snapshot
+    """
+    def __init__(self, directory:Path, name:str, flush_interval:float=1.0, compact_every:int=5000):
+        self.compact_every = compact_every
+        
+        self.log_path = directory / f"{name}.log"
+        self.snapshot_path = directory / f"{name}.snapshot.json"
+        super().__init__(flush_interval, f"the vote event log {self.log_path}")
+        
+        self._snapshot_source = None    # returns the events that rebuild the current vote
+        self._seq = 0                   # sequence number of the last event appended
+        self._since_snapshot = 0        # events appended since the last snapshot
+        self._opened = False            # whether _seq has caught up with what's on disk
+    
+    def set_snapshot_source(self, source:Callable[[], List[Dict]]) -> None:
+        self._snapshot_source = source
+    
+    def append(self, event:Dict) -> None:
+        """Adds an event to the log, it's written to disk shortly after"""
+        self._seq += 1
+        event["seq"] = self._seq
+        self._since_snapshot += 1
+        self._buffer(json.dumps(event, separators=(",", ":")) + "\n")
+    
+    async def open(self) -> None:
+        """
+        Carries on the sequence numbers from what's already on disk, must be done before the first append,
+        otherwise the new events would be numbered below the snapshot's and skipped when the log is loaded
+        """
+        if not self._opened:
+            await self.load()
+    
+    async def load(self) -> List[Dict]:
+        """Returns the events needed to rebuild the vote (the snapshot's, then the log's), oldest first"""
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            events, seq = await loop.run_in_executor(None, self._read)
+            
+            # Never go backwards, events may have been appended since this was first opened
+            self._seq = max(self._seq, seq)
+            self._opened = True
+        
+        self._since_snapshot = len(events)
+        return events
+    
+    async def flush(self) -> None:
+        """Writes out the buffered events, compacting the log first if it has grown long enough"""
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            
+            if self._since_snapshot >= self.compact_every and self._snapshot_source is not None:
+                await self._compact(loop)
+            elif len(self._pending) > 0:
+                lines, self._pending = self._pending, []
+                await loop.run_in_executor(None, self._write_now, lines)
+    
+    async def compact(self) -> None:
+        """Replaces the snapshot with the current vote, and empties the log"""
+        async with self._lock:
+            await self._compact(asyncio.get_event_loop())
+    
+    def close(self) -> None:
+        """Lets go of the vote the snapshots are taken from, and writes out anything still buffered"""
+        self._snapshot_source = None
+        self.flush_now()
+    
+    """ Private methods """
+    
+    async def _compact(self, loop:asyncio.AbstractEventLoop) -> None:
+        # The snapshot already covers every buffered event, so they don't need to be written
+        snapshot = {"seq": self._seq, "events": self._snapshot_source() if self._snapshot_source is not None else []}
+        self._pending = []
+        self._since_snapshot = 0
+        
+        await loop.run_in_executor(None, self._write_snapshot, snapshot)
+    
+    def _read(self) -> Tuple[List[Dict], int]:
+        events = []
+        snapshot_seq = 0
+        
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            
+            snapshot_seq = snapshot["seq"]
+            events.extend(snapshot["events"])
+        
+        last_seq = snapshot_seq
+        if self.log_path.exists():
+            with open(self.log_path, "r+b") as f:
+                good_bytes = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Unterminated line")
+                        
+                        event = json.loads(line)
+                    except ValueError:
+                        # Only the last line can be cut off (ie. the bot died mid-write), drop it so new events start on a fresh line
+                        log.warning("Dropping a partly written line from %s", self.log_path)
+                        f.truncate(good_bytes)
+                        break
+                    
+                    good_bytes += len(line)
+                    
+                    # Events from before the snapshot are already part of it (ie. the bot died mid-compaction)
+                    if event["seq"] > snapshot_seq:
+                        events.append(event)
+                        last_seq = event["seq"]
+        
+        return events, last_seq
+    
+    def _write_now(self, lines:List[str]) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _write_snapshot(self, snapshot:Dict) -> None:
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Write the new snapshot to the side and swap it in, so there's always a whole snapshot on disk
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_path, self.snapshot_path)
+        
+        # Everything in the log is in the snapshot now
+        with open(self.log_path, "w", encoding="utf-8"):
+            pass
@@ -0,0 +1,138 @@
+from fuzzysearch import find_near_matches
+from typing import Iterable, List, Optional
+
+def normalize_title(title:str) -> str:
+    """The form titles are compared in to find duplicates, case and extra whitespace are ignored"""
+    return " ".join(title.casefold().split())
+
+class FuzzyIndex:
+    """
+    Index of suggestion titles for fuzzy searching,
+    an inverted index of character n-grams is used to only search the titles that could be the best match
+    """
+    def __init__(self, titles:Iterable[str]=(), gram_size:int=3, max_dist:int=5):
+        self.gram_size = gram_size
+        self.max_dist = max_dist
+        
+        self._titles = {}   # title -> lowercase title
+        self._order = {}    # title -> position it was added in (earlier titles win ties)
+        self._grams = {}    # n-gram -> titles containing it
+        self._normalized = {} # normalized title -> titles with that form, earliest first
+        self._next_order = 0
+        
+        for title in titles:
+            self.add(title)
+    
+    def add(self, title:str) -> None:
+        if title in self._titles:
+            return
+        
+        lower_title = title.lower()
+        self._titles[title] = lower_title
+        self._order[title] = self._next_order
+        self._next_order += 1
+        self._normalized.setdefault(normalize_title(title), []).append(title)
+        
+        for gram in set(self._gram_list(lower_title)):
+            self._grams.setdefault(gram, set()).add(title)
+    
+    def remove(self, title:str) -> None:
+        lower_title = self._titles.pop(title, None)
+        if lower_title is None:
+            return
+        
+        del self._order[title]
+        
+        # Lists saved before duplicates were caught can have several titles with the same form
+        normalized = normalize_title(title)
+        duplicates = self._normalized[normalized]
+        duplicates.remove(title)
+        if len(duplicates) == 0:
+            del self._normalized[normalized]
+        
+        for gram in set(self._gram_list(lower_title)):
+            titles = self._grams[gram]
+            titles.discard(title)
+            if len(titles) == 0:
+                del self._grams[gram]
+    
+    def clear(self) -> None:
+        self._titles = {}
+        self._order = {}
+        self._grams = {}
+        self._normalized = {}
+        self._next_order = 0
+    
+    def search(self, query:str) -> Optional[str]:
+        """
+        Returns the title with the closest fuzzy match for the query (earliest title on ties),
+        or None if nothing matched
+        """
+        lower_query = query.lower()
+        query_grams = self._gram_list(lower_query)
+        
+        # Count how many of the query's n-grams show up in each title
+        hits = {}
+        for gram in query_grams:
+            for title in self._grams.get(gram, ()):
+                hits[title] = hits.get(title, 0) + 1
+        
+        # Every edit can break at most gram_size of the query's n-grams, so the number of missing
+        # n-grams gives a lower bound on the distance of any match in that title
+        def min_dist(num_hits:int) -> int:
+            return max(0, -(-(len(query_grams) - num_hits) // self.gram_size))
+        
+        best_title = None
+        best_dist = None
+        
+        def check(title:str) -> None:
+            nonlocal best_title, best_dist
+            
+            dist = self._match_dist(lower_query, title)
+            if dist is None:
+                return
+            
+            if best_title is None or dist < best_dist or (dist == best_dist and self._order[title] < self._order[best_title]):
+                best_title = title
+                best_dist = dist
+        
+        # Search the most promising titles first, and stop once no other title could do better
+        candidates = sorted(hits, key=lambda t: (min_dist(hits[t]), self._order[t]))
+        for title in candidates:
+            if best_title is not None and min_dist(hits[title]) > best_dist:
+                break
+            
+            check(title)
+        
+        # Titles that don't share a single n-gram with the query only need searching if they could still win
+        no_hit_dist = min_dist(0)
+        if no_hit_dist <= self.max_dist and (best_title is None or no_hit_dist <= best_dist):
+            for title in self._titles:
+                if title not in hits:
+                    check(title)
+        
+        return best_title
+    
+    def find_duplicate(self, title:str) -> Optional[str]:
+        """Returns the title that's the same as the given one once normalized (if any)"""
+        duplicates = self._normalized.get(normalize_title(title))
+        return duplicates[0] if duplicates is not None else None
+    
+    def __contains__(self, title:str) -> bool:
+        return title in self._titles
+    
+    def __len__(self) -> int:
+        return len(self._titles)
+    
+    """ Private methods """
+    
+    def _gram_list(self, text:str) -> List[str]:
+        return [text[i:i + self.gram_size] for i in range(len(text) - self.gram_size + 1)]
+    
+    def _match_dist(self, lower_query:str, title:str) -> Optional[int]:
+        max_l_dist = max(0, min(self.max_dist, len(title) - 2))
+        matches = find_near_matches(lower_query, self._titles[title], max_l_dist=max_l_dist)
+        if len(matches) == 0:
+            return None
+        
+        return min(match.dist for match in matches)
@@ -0,0 +1,95 @@
+import time
+
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+class LatencyHistogram:
+    """Latency histogram with fixed buckets (in seconds), cheap enough to update on every event"""
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1) # the last bucket catches everything slower
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds:float) -> None:
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+    
+    def percentile(self, pct:float) -> float:
+        """Returns the upper bound of the bucket the percentile falls in (or the max, for the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        
+        target = pct / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count > 0:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        
+        return self.max
+    
+    def as_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count > 0 else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("inf",), self.counts)}
+        }
+
+class GuildMetrics:
+    """Counters and latency histograms for a single guild"""
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+    
+    def incr(self, name:str, amount:int=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def observe(self, name:str, seconds:float) -> None:
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+        
+        self.histograms[name].observe(seconds)
+    
+    @contextmanager
+    def time(self, name:str) -> Iterator[None]:
+        """Times the block into the named histogram (failures included)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+    
+    def as_dict(self) -> Dict:
+        return {
+            "counters": dict(self.counters),
+            "latencies": {name: histogram.as_dict() for name, histogram in self.histograms.items()}
+        }
+
+class MetricsRegistry:
+    """Per-guild metrics for the cog"""
+    def __init__(self):
+        self._guilds = {}
+    
+    def guild(self, guild_id:int) -> GuildMetrics:
+        if guild_id not in self._guilds:
+            self._guilds[guild_id] = GuildMetrics()
+        
+        return self._guilds[guild_id]
+    
+    def forget(self, guild_id:int) -> None:
+        self._guilds.pop(guild_id, None)
+    
+    def as_dict(self) -> Dict[int, Dict]:
+        return {guild_id: metrics.as_dict() for guild_id, metrics in self._guilds.items()}
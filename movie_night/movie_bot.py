@@ -1,10 +1,35 @@
+import asyncio
+import csv
 import discord
-from fuzzysearch import find_near_matches
+import functools
+import io
+import logging
+import re
+import sqlite3
+import time
+
+from typing import Dict, Hashable, List, Optional, Tuple, Union
 from redbot.core import commands
 from redbot.core import Config
 from redbot.core import checks
+from redbot.core.data_manager import cog_data_path
 
+from .deadlines import DeadlineScheduler, next_cron_time, parse_duration
+from .eventlog import VoteEventLog
+from .fuzzyindex import FuzzyIndex, normalize_title
+from .metrics import MetricsRegistry
+from .profiler import CogProfiler
+from .ranked_choice import TALLY_MODES
+from .settings import GuildSettingsCache
+from .suggestions import EXPORT_FORMATS, SuggestionPages, dump_suggestions, parse_suggestions
+from .votecache import VoteInfoCache
 from .voteinfo import VoteInfo, VoteException
+from .votestore import VOTE_STORES, SqliteVoteStore, VoteStore
+
+log = logging.getLogger("red.mogs.movie_night")
+
+# Poll names are used in file names and command arguments, so they're kept simple
+_poll_name_re = re.compile(r"^[a-z0-9_-]{1,32}$")
 
 class MovieNightCog(commands.Cog):
     """Custom Movie Night Cog"""
@@ -17,61 +42,536 @@ class MovieNightCog(commands.Cog):
         # 77 79 86 73 69 == 'MOVIE'
         self.config = Config.get_conf(self, identifier=7779867369)
         
-        default_global = {}
+        default_global = {
+            "warm_restore": True,
+            "vote_store": "memory"  # Where the vote tallies are kept, one of VOTE_STORES
+        }
         
         default_guild = {
             "vote_size": 10,            # Deprecated
             "suggestions": [],
-            "timezone_str": "UTC",      # Deprecated
-            "movie_time": "0 20 * * 5", # Deprecated
+            "timezone_str": "UTC",
+            "movie_time": "0 20 * * 5", # Cron schedule, votes can be set to close at the next one
             "next_movie_title": "",     # Deprecated
-            "prev_vote_msg_id": -1
+            "prev_vote_msg_id": -1,
+            "prev_vote_channel_id": -1,
+            "prev_vote_shard_ids": [],  # All the vote's messages, when it is split across several
+            "sharded_votes": False,
+            "tally_mode": "plurality",  # How the winner is picked, one of TALLY_MODES
+            "vote_deadline": -1,        # Unix timestamp the on-going vote closes at by itself
+            "polls": []                 # Named polls running alongside the movie vote, as {"name", "channel_id", "msg_ids", "options"}
         }
         
         self.config.register_global(**default_global)
         self.config.register_guild(**default_guild)
         
-        self.vote_info = {}
+        # Guild settings are read from memory, and written back once per command
+        self.settings = GuildSettingsCache(self.config)
         
-    """Helper Functions"""
-    async def get_guild_message(self, guild:discord.Guild, message_id:int):
-        # TODO: Find a better way of loading messages after a restart, since this would be *very very* bad on a large server
-        # Probably, just setting a channel to be the *voting* channel would be easiest, but I'm lazy
+        self.metrics = MetricsRegistry()
+        
+        # Guilds without an on-going vote are dropped from here when they haven't been used in a while,
+        # along with their event logs (and their metrics and suggestion caches, once none of their votes are left)
+        self.vote_info = VoteInfoCache(on_evict=self._vote_info_evicted)
+        self._vote_info_loads = {}
+        self.event_logs = {}
+        self.vote_store = None  # set up on first use, from the global setting
+        
+        # Message id of every on-going vote and poll -> (guild id, poll name or None for the movie vote),
+        # so reactions are routed to their vote (and reactions elsewhere dropped) without touching Config
+        self.vote_msgs = {}
+        self._vote_msgs_loaded = False
+        self.suggestion_index = {}
+        self.suggestion_pages = SuggestionPages()
+        
+        # Controls for paging through the suggestions list, and how long it listens to them for
+        self.page_controls = ("⬅️", "➡️")
+        self.page_timeout = 60.0
+        
+        # Max number of channels probed at once when looking for a vote message without a known channel
+        self.message_probe_concurrency = 8
+        
+        # Max number of votes restored at once when the cog starts up
+        self.warm_restore_concurrency = 16
+        
+        # Max number of messages a sharded vote can be split across (each holds 20 options)
+        self.max_vote_shards = 10
+        
+        # Max number of polls a guild can run at once, on top of the movie vote
+        self.max_polls = 10
+        
+        # Max size of a suggestions file that can be imported
+        self.max_import_bytes = 1024 * 1024
+        
+        # How often on-going votes are looked at to see if they're due to be checked against their reactions
+        self.reconcile_tick = 30.0
+        
+        # The listeners and commands are wrapped so they can be profiled on demand
+        self.profiler = CogProfiler()
+        self.max_profile_seconds = 600
+        self._profile_task = None
+        
+        for command in self.walk_commands():
+            command.callback = self.profiler.wrap(command.callback)
+        
+        for listener in ("on_raw_reaction_add", "on_raw_reaction_remove", "on_raw_reaction_clear", "on_raw_reaction_clear_emoji"):
+            setattr(self, listener, self.profiler.wrap(getattr(self, listener)))
+        
+        # Every guild's timed vote shares the one timer
+        self.deadlines = DeadlineScheduler(self._auto_close_vote)
+        
+        self._warm_task = self.bot.loop.create_task(self._warm_vote_info())
+        self._reconcile_task = self.bot.loop.create_task(self._reconcile_votes())
+    
+    def cog_unload(self):
+        self._warm_task.cancel()
+        self._reconcile_task.cancel()
+        self.profiler.stop()
+        
+        if self._profile_task is not None:
+            self._profile_task.cancel()
         
-        for channel in guild.text_channels:
+        self.deadlines.stop()
+        
+        if self.vote_store is not None:
+            self.vote_store.close()
+        
+        for event_log in self.event_logs.values():
             try:
-                msg = await channel.fetch_message(message_id)
-            except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                #TODO: Find a way to retry this sanely
-                continue
-            else:
-                return msg
+                event_log.flush_now()
+            except OSError:
+                log.exception("Failed to write the vote event log %s", event_log.log_path)
+        
+    """Helper Functions"""
+    async def get_guild_message(self, guild:discord.Guild, message_id:int, channel_id:int=-1):
+        # If we know which channel the message was posted in, go straight to it
+        if channel_id > 0:
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                try:
+                    return await channel.fetch_message(message_id)
+                except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+                    self.metrics.guild(guild.id).incr("message_fetch_errors")
+        
+        # Otherwise (ie. votes started before the channel was saved) probe the text channels,
+        # a few at a time, and stop as soon as one of them has the message
+        semaphore = asyncio.Semaphore(self.message_probe_concurrency)
+        
+        async def probe(channel:discord.TextChannel):
+            async with semaphore:
+                try:
+                    return await channel.fetch_message(message_id)
+                except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+                    #TODO: Find a way to retry this sanely
+                    self.metrics.guild(guild.id).incr("message_probe_misses")
+                    return None
+        
+        tasks = [asyncio.ensure_future(probe(channel)) for channel in guild.text_channels]
+        try:
+            for task in asyncio.as_completed(tasks):
+                msg = await task
+                if msg is not None:
+                    return msg
+        finally:
+            for task in tasks:
+                task.cancel()
         
         return None
     
-    async def get_vote_info(self, guild_id: int) -> VoteInfo:
-        # If a new structure needs to be made
-        if guild_id not in self.vote_info:
-            # Create a VoteInfo structure
-            self.vote_info[guild_id] = VoteInfo()
-            
-            # Check if there was a vote happening
-            msg = None
-            prev_vote_msg_id = await self.config.guild_from_id(guild_id).prev_vote_msg_id()
-            if prev_vote_msg_id > 0:
-                # Try to get the previous message
-                msg = await self.get_guild_message(self.bot.get_guild(guild_id), prev_vote_msg_id)
+    async def get_channel_message(self, channel:discord.TextChannel, message_id:int):
+        try:
+            return await channel.fetch_message(message_id)
+        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
+            self.metrics.guild(channel.guild.id).incr("message_fetch_errors")
+            return None
+    
+    def vote_key(self, guild_id:int, poll:Optional[str]=None) -> Hashable:
+        # The movie vote is keyed by the guild id alone, and each poll by the guild id and its name
+        return guild_id if poll is None else (guild_id, poll)
+    
+    async def get_vote_info(self, guild_id: int, poll:Optional[str]=None) -> VoteInfo:
+        """Returns the guild's movie vote, or one of its polls if a poll name is given"""
+        key = self.vote_key(guild_id, poll)
+        vinfo = self.vote_info.get(key)
+        if vinfo is not None:
+            return vinfo
+        
+        # Only restore a vote once, everyone who asks in the meantime waits on the same restore
+        load = self._vote_info_loads.get(key)
+        if load is None:
+            load = asyncio.ensure_future(self._load_vote_info(guild_id) if poll is None else self._load_poll_info(guild_id, poll))
+            load.add_done_callback(lambda _: self._vote_info_loads.pop(key, None))
+            self._vote_info_loads[key] = load
+        
+        # Shielded so a cancelled caller doesn't cancel the restore for everyone else
+        return await asyncio.shield(load)
+    
+    async def _load_vote_info(self, guild_id: int) -> VoteInfo:
+        # Create a VoteInfo structure, it's only made visible once it's fully restored
+        metrics = self.metrics.guild(guild_id)
+        event_log = self.get_event_log(guild_id)
+        vinfo = await self.new_vote_info(guild_id)
+        
+        # Check if there was a vote happening
+        msg = None
+        settings = await self.settings.get(guild_id)
+        prev_vote_msg_id = settings["prev_vote_msg_id"]
+        if prev_vote_msg_id > 0:
+            metrics.incr("restores")
+            restore_started = time.perf_counter()
+            
+            guild = self.bot.get_guild(guild_id)
+            prev_vote_channel_id = settings["prev_vote_channel_id"]
+            channel = guild.get_channel(prev_vote_channel_id) if guild is not None and prev_vote_channel_id > 0 else None
+            
+            # Rebuild the vote from the local event log if we can, it doesn't need to read anything from Discord
+            msg_ids = settings["prev_vote_shard_ids"] or [prev_vote_msg_id]
+            if channel is not None and await self._restore_from_log(vinfo, event_log, channel, msg_ids):
+                metrics.incr("log_restores")
+                metrics.observe("restore", time.perf_counter() - restore_started)
+                self.vote_info[guild_id] = vinfo
+                return vinfo
+            
+            # The bot has left the guild, or it's unavailable, so there's nothing to read the vote back from (or to clear it for)
+            if guild is None:
+                metrics.observe("restore", time.perf_counter() - restore_started)
+                self.vote_info[guild_id] = vinfo
+                return vinfo
+            
+            # Otherwise fall back to reading the votes back from the reactions on the vote messages
+            metrics.incr("scrape_restores")
+            vinfo = await self.new_vote_info(guild_id)
+            msg = await self.get_guild_message(guild, prev_vote_msg_id, prev_vote_channel_id)
+            
+            # Failed to retrieve the message
+            if msg is None:
+                # Set the prev_msg id to invalid
+                metrics.incr("restore_failures")
+                async with self.settings.edit(guild_id) as settings:
+                    self.clear_prev_vote(settings)
+            else:
+                # Remember where the message is, so the next restore doesn't have to look for it
+                if msg.channel.id != prev_vote_channel_id:
+                    async with self.settings.edit(guild_id) as settings:
+                        settings["prev_vote_channel_id"] = msg.channel.id
+                
+                # A vote split across several messages has the rest of its messages in the same channel
+                prev_vote_shard_ids = settings["prev_vote_shard_ids"]
+                shard_msgs = await asyncio.gather(*[self.get_channel_message(msg.channel, shard_id) for shard_id in prev_vote_shard_ids[1:]])
+                
+                # Get the list of suggestions for the server (a copy, since the vote adds to its own list)
+                suggestions = list(settings["suggestions"])
+                await vinfo._set_prev_vote_msgs([msg] + shard_msgs, suggestions, self.bot.user.id)
                 
-                # Failed to retrieve the message
-                if msg is None:
-                    # Set the prev_msg id to invalid
-                    await self.config.guild_from_id(guild_id).prev_vote_msg_id.set(-1)
+                # Start the log over from what the reactions say
+                await event_log.compact()
+            
+            metrics.observe("restore", time.perf_counter() - restore_started)
+        
+        self.vote_info[guild_id] = vinfo
+        return vinfo
+    
+    async def _load_poll_info(self, guild_id:int, name:str) -> VoteInfo:
+        metrics = self.metrics.guild(guild_id)
+        event_log = self.get_event_log(guild_id, name)
+        vinfo = await self.new_vote_info(guild_id, name)
+        
+        settings = await self.settings.get(guild_id)
+        poll = self.find_poll(settings, name)
+        if poll is not None:
+            metrics.incr("restores")
+            restore_started = time.perf_counter()
+            
+            guild = self.bot.get_guild(guild_id)
+            channel = guild.get_channel(poll["channel_id"]) if guild is not None else None
+            
+            # Polls are restored the same way as the movie vote, except their options are saved with them
+            if channel is not None:
+                if await self._restore_from_log(vinfo, event_log, channel, poll["msg_ids"]):
+                    metrics.incr("log_restores")
                 else:
-                    # Get the list of suggestions for the server
-                    suggestions = await self.config.guild_from_id(guild_id).suggestions()
-                    await self.vote_info[guild_id]._set_prev_vote_msg(msg, suggestions, self.bot.user.id)
+                    metrics.incr("scrape_restores")
+                    vinfo = await self.new_vote_info(guild_id, name)
+                    msgs = await asyncio.gather(*[self.get_channel_message(channel, msg_id) for msg_id in poll["msg_ids"]])
+                    await vinfo._set_prev_vote_msgs(msgs, list(poll["options"]), self.bot.user.id)
+                    
+                    if vinfo.is_voting_enabled():
+                        await event_log.compact()
+            
+            # Unless the guild is unavailable, a poll whose messages are gone is over
+            if not vinfo.is_voting_enabled() and guild is not None:
+                metrics.incr("restore_failures")
+                async with self.settings.edit(guild_id) as settings:
+                    self.remove_poll(settings, name)
+            
+            metrics.observe("restore", time.perf_counter() - restore_started)
+        
+        self.vote_info[self.vote_key(guild_id, name)] = vinfo
+        return vinfo
+    
+    async def _load_vote_msgs(self) -> None:
+        all_guilds = await self.config.all_guilds()
+        for guild_id, data in all_guilds.items():
+            if data["prev_vote_msg_id"] > 0:
+                self.route_vote_msgs(guild_id, None, [data["prev_vote_msg_id"]] + data["prev_vote_shard_ids"])
+                
+                if data["vote_deadline"] > 0:
+                    self.deadlines.schedule(guild_id, data["vote_deadline"])
+            
+            for poll in data["polls"]:
+                self.route_vote_msgs(guild_id, poll["name"], poll["msg_ids"])
+        
+        self._vote_msgs_loaded = True
+    
+    async def _restore_from_log(self, vinfo:VoteInfo, event_log:VoteEventLog, channel:discord.TextChannel, msg_ids:List[int]) -> bool:
+        try:
+            events = await event_log.load()
+        except (OSError, ValueError, KeyError):
+            log.exception("Failed to read the vote event log %s", event_log.log_path)
+            return False
+        
+        # The messages are only edited and reacted to, so there's no need to fetch them
+        vote_msgs = [channel.get_partial_message(msg_id) for msg_id in msg_ids]
+        
+        try:
+            return await vinfo._restore_from_log(events, vote_msgs)
+        except sqlite3.Error:
+            log.exception("Failed to read the vote database")
+            return False
+    
+    async def _warm_vote_info(self) -> None:
+        """Restores every guild's on-going vote up front, so the first reaction doesn't have to wait on it"""
+        await self._load_vote_msgs()
+        await self.bot.wait_until_ready()
+        
+        # Votes whose deadline passed while the bot was down are closed straight away
+        self.deadlines.start()
+        
+        if not await self.config.warm_restore():
+            return
+        
+        all_guilds = await self.config.all_guilds()
+        votes = []
+        for guild_id, data in all_guilds.items():
+            if data["prev_vote_msg_id"] > 0:
+                votes.append((guild_id, None))
+            
+            votes.extend((guild_id, poll["name"]) for poll in data["polls"])
+        
+        # A few at a time, restores that fall back to reading the reactions can probe a lot of channels
+        semaphore = asyncio.Semaphore(self.warm_restore_concurrency)
+        
+        async def restore(guild_id:int, poll:Optional[str]) -> VoteInfo:
+            async with semaphore:
+                return await self.get_vote_info(guild_id, poll)
+        
+        results = await asyncio.gather(*[restore(guild_id, poll) for guild_id, poll in votes], return_exceptions=True)
+        for (guild_id, poll), result in zip(votes, results):
+            if isinstance(result, Exception):
+                log.error("Failed to restore the vote %s", self.vote_key(guild_id, poll), exc_info=result)
+    
+    async def _reconcile_votes(self) -> None:
+        """Every so often checks the on-going votes against their reactions, to catch any reaction events that were missed"""
+        await self.bot.wait_until_ready()
+        
+        while True:
+            await asyncio.sleep(self.reconcile_tick)
+            
+            # Idle votes would otherwise only be dropped when another one is loaded
+            self.vote_info.evict()
+            
+            # One vote at a time, so the checks don't all hit the rate limits at once
+            for key, vinfo in list(self.vote_info.items()):
+                if not vinfo.is_voting_enabled() or not vinfo.is_reconcile_due():
+                    continue
+                
+                metrics = vinfo.metrics
+                try:
+                    with metrics.time("reconcile"):
+                        corrected = await vinfo.reconcile(self.bot.user.id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Failed to reconcile the vote %s", key)
+                    continue
+                
+                metrics.incr("reconciles")
+                metrics.incr("reconcile_corrections", corrected)
+    
+    def get_metrics(self, guild_id:Optional[int]=None) -> Dict:
+        """
+        Returns the runtime metrics for a guild (or every guild, keyed by guild id) as a plain dict,
+        counters are totals since the cog was loaded and latencies are in seconds
+        """
+        if guild_id is None:
+            return {gid: self.get_metrics(gid) for gid in self.metrics.as_dict()}
+        
+        stats = self.metrics.guild(guild_id).as_dict()
+        vinfo = self.vote_info.get(guild_id)
+        if vinfo is not None:
+            stats["render"] = vinfo.get_render_stats()
+            stats["seeding"] = vinfo.get_seed_stats()
+            stats["vote_bytes"] = vinfo.get_memory_footprint()
+        
+        stats["vote_cache"] = self.vote_info.footprint()
+        if self.vote_store is not None:
+            stats["vote_store"] = self.vote_store.stats()
+        
+        return stats
+    
+    def route_vote_msgs(self, guild_id:int, poll:Optional[str], msg_ids:List[int]) -> None:
+        for msg_id in msg_ids:
+            self.vote_msgs[msg_id] = (guild_id, poll)
+    
+    def unroute_vote_msgs(self, msg_ids:List[int]) -> None:
+        for msg_id in msg_ids:
+            self.vote_msgs.pop(msg_id, None)
+    
+    def set_prev_vote(self, guild_id:int, settings:Dict, vinfo:VoteInfo, channel_id:int) -> None:
+        self.unroute_vote_msgs(settings["prev_vote_shard_ids"])
+        
+        msg_ids = vinfo.get_msg_ids()
+        settings["prev_vote_msg_id"] = msg_ids[0]
+        settings["prev_vote_channel_id"] = channel_id
+        settings["prev_vote_shard_ids"] = msg_ids
+        
+        self.route_vote_msgs(guild_id, None, msg_ids)
+    
+    def clear_prev_vote(self, settings:Dict) -> None:
+        self.unroute_vote_msgs([settings["prev_vote_msg_id"]] + settings["prev_vote_shard_ids"])
+        
+        settings["prev_vote_msg_id"] = -1
+        settings["prev_vote_channel_id"] = -1
+        settings["prev_vote_shard_ids"] = []
+        settings["vote_deadline"] = -1
+    
+    def find_poll(self, settings:Dict, name:str) -> Optional[Dict]:
+        for poll in settings["polls"]:
+            if poll["name"] == name:
+                return poll
+        
+        return None
+    
+    def add_poll(self, guild_id:int, settings:Dict, name:str, vinfo:VoteInfo, channel_id:int, options:List[str]) -> None:
+        msg_ids = vinfo.get_msg_ids()
+        settings["polls"].append({"name": name, "channel_id": channel_id, "msg_ids": msg_ids, "options": options})
+        self.route_vote_msgs(guild_id, name, msg_ids)
+    
+    def remove_poll(self, settings:Dict, name:str) -> None:
+        poll = self.find_poll(settings, name)
+        if poll is not None:
+            settings["polls"].remove(poll)
+            self.unroute_vote_msgs(poll["msg_ids"])
+    
+    def parse_poll_options(self, options:str) -> List[str]:
+        """Splits "a | b | c" into its options, dropping empty and repeated ones"""
+        choices = []
+        seen = set()
+        for option in options.split("|"):
+            option = " ".join(option.split())
+            if option != "" and normalize_title(option) not in seen:
+                seen.add(normalize_title(option))
+                choices.append(option)
+        
+        return choices
+    
+    def get_max_suggestions(self, settings:Dict) -> int:
+        # Sharded votes can have more options than fit on a single message
+        if settings["sharded_votes"]:
+            return 20 * self.max_vote_shards
+        
+        return 20
+    
+    def parse_vote_deadline(self, when:str, settings:Dict) -> float:
+        """Turns "movie_time" (the next time on the guild's schedule) or a duration like "2h" into a unix timestamp"""
+        if when.lower() == "movie_time":
+            return next_cron_time(settings["movie_time"], settings["timezone_str"])
+        
+        seconds = parse_duration(when)
+        if seconds is None or seconds <= 0:
+            raise ValueError(f"\"{when}\" isn't a duration (eg. 90m or 1h30m) or movie_time.")
+        
+        return time.time() + seconds
+    
+    async def _auto_close_vote(self, guild_id:int) -> None:
+        settings = await self.settings.get(guild_id)
+        if settings["prev_vote_msg_id"] <= 0 or settings["vote_deadline"] <= 0:
+            return
         
-        return self.vote_info[guild_id]
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(settings["prev_vote_channel_id"]) if guild is not None else None
+        if channel is None:
+            log.warning("Couldn't find the channel to close the vote for guild %s in", guild_id)
+            async with self.settings.edit(guild_id) as settings:
+                settings["vote_deadline"] = -1
+            return
+        
+        await self._stop_vote(guild, channel)
+    
+    async def _stop_vote(self, guild:discord.Guild, channel:discord.abc.Messageable) -> None:
+        """Stops the guild's vote, posting the results to the channel"""
+        self.deadlines.cancel(guild.id)
+        
+        vinfo = await self.get_vote_info(guild.id)
+        tally_mode = (await self.settings.get(guild.id))["tally_mode"]
+        winner = None
+        try:
+            winner, bad_votes = await vinfo.stop_vote(channel, tally_mode)
+        except VoteException as ve:
+            await channel.send(str(ve))
+        finally:
+            # Save the results and clear the vote in one write
+            async with self.settings.edit(guild.id) as settings:
+                if winner is not None:
+                    suggestions = settings["suggestions"]
+                    suggestion_index = self.get_suggestion_index(guild.id, suggestions)
+                    
+                    try:
+                        # Remove the winner from the list and set it as the next movie title
+                        suggestions.remove(winner)
+                        suggestion_index.remove(winner)
+                    except ValueError:
+                        pass
+                    
+                    for x in bad_votes:
+                        try:
+                            # Also remove the "bad votes"
+                            suggestions.remove(x)
+                            suggestion_index.remove(x)
+                        except ValueError:
+                            pass
+                    
+                    settings["next_movie_title"] = winner
+                    self.suggestion_pages.invalidate(guild.id)
+                
+                self.clear_prev_vote(settings)
+    
+    async def _profile_window(self, channel:discord.abc.Messageable, seconds:int) -> None:
+        await asyncio.sleep(seconds)
+        await self._send_profile_report(channel)
+    
+    async def _send_profile_report(self, channel:discord.abc.Messageable) -> None:
+        report = self.profiler.stop()
+        if report is None:
+            return
+        
+        await channel.send(
+            "Profiling stopped, here are the hot spots:",
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename="movie_night_profile.txt")
+        )
+    
+    def get_suggestions_embed(self, guild_id:int, suggestions:List[str], page:int) -> discord.Embed:
+        em = discord.Embed(
+            title="**Movie Suggestions:**\n",
+            description=self.suggestion_pages.page(guild_id, suggestions, page),
+            color=discord.Color.green()
+        )
+        
+        num_pages = self.suggestion_pages.num_pages(suggestions)
+        if num_pages > 1:
+            em.set_footer(text=f"Page {page + 1}/{num_pages}")
+        
+        return em
     
     def represents_int(self, var) -> bool:
         try:
@@ -80,44 +580,178 @@ class MovieNightCog(commands.Cog):
         except ValueError:
             return False
     
-    def fuzzy_suggestion_search(self, suggestion, suggestion_list):
-        lowest_match = None
-        lowest_score = 100
-        for s in suggestion_list:
-            matches = find_near_matches(suggestion.lower(), s.lower(), max_l_dist=min(5, len(s)-2))
-            score = sorted(matches, key=lambda x: x.dist)
-            if len(score) > 0 and score[0].dist < lowest_score:
-                lowest_score = score[0].dist
-                lowest_match = s
-            
-        return lowest_match
+    def route_reaction(self, raw_reaction:Union[discord.RawReactionActionEvent, discord.RawReactionClearEvent, discord.RawReactionClearEmojiEvent]) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Synchronous lookup of the (guild id, poll name) a reaction's vote is, or None if it isn't on a vote message,
+        so other reactions never wait on a restore
+        """
+        route = self.vote_msgs.get(raw_reaction.message_id)
+        if route is not None or self._vote_msgs_loaded:
+            return route
+        
+        # Until the ids are loaded from Config we can't tell, so take the slow path through the movie vote
+        return (raw_reaction.guild_id, None)
+    
+    def vote_name(self, guild_id:int, poll:Optional[str]=None) -> str:
+        # Names the vote's event log and its tally in a shared store
+        return str(guild_id) if poll is None else f"{guild_id}.poll.{poll}"
+    
+    def _vote_info_evicted(self, key:Hashable, vinfo:VoteInfo) -> None:
+        event_log = self.event_logs.pop(key, None)
+        if event_log is not None:
+            try:
+                event_log.close()
+            except OSError:
+                log.exception("Failed to write the vote event log %s", event_log.log_path)
+        
+        guild_id = key[0] if isinstance(key, tuple) else key
+        if any((other[0] if isinstance(other, tuple) else other) == guild_id for other, _ in self.vote_info.items()):
+            return
+        
+        self.metrics.forget(guild_id)
+        self.suggestion_index.pop(guild_id, None)
+        self.suggestion_pages.invalidate(guild_id)
+    
+    def get_event_log(self, guild_id:int, poll:Optional[str]=None) -> VoteEventLog:
+        key = self.vote_key(guild_id, poll)
+        if key not in self.event_logs:
+            self.event_logs[key] = VoteEventLog(cog_data_path(self) / "votes", self.vote_name(guild_id, poll))
+        
+        return self.event_logs[key]
+    
+    async def get_vote_store(self) -> VoteStore:
+        if self.vote_store is None:
+            if await self.config.vote_store() == "sqlite":
+                self.vote_store = SqliteVoteStore(cog_data_path(self) / "votes" / "votes.sqlite3")
+            else:
+                self.vote_store = VoteStore()
+        
+        return self.vote_store
+    
+    async def new_vote_info(self, guild_id:int, poll:Optional[str]=None) -> VoteInfo:
+        """Creates an empty VoteInfo for the guild's movie vote (or one of its polls), with its tally in the configured store"""
+        store = await self.get_vote_store()
+        
+        # The log's sequence numbers have to carry on from the last vote's before anything is logged
+        event_log = self.get_event_log(guild_id, poll)
+        try:
+            await event_log.open()
+        except (OSError, ValueError, KeyError):
+            log.exception("Failed to read the vote event log %s", event_log.log_path)
+        
+        return VoteInfo(
+            metrics=self.metrics.guild(guild_id),
+            event_log=event_log,
+            title="Movie Vote" if poll is None else f"Poll: {poll}",
+            tally=store.tally(self.vote_name(guild_id, poll)),
+            on_lost=functools.partial(self._vote_lost, guild_id, poll)
+        )
+    
+    async def _vote_lost(self, guild_id:int, poll:Optional[str]) -> None:
+        # The vote ended itself because its message was deleted, so forget it was ever running
+        async with self.settings.edit(guild_id) as settings:
+            if poll is None:
+                self.deadlines.cancel(guild_id)
+                self.clear_prev_vote(settings)
+            else:
+                self.remove_poll(settings, poll)
+    
+    def get_suggestion_index(self, guild_id:int, suggestions:List[str]) -> FuzzyIndex:
+        """Returns the fuzzy search index for a guild's suggestions, building it from the given list the first time"""
+        if guild_id not in self.suggestion_index:
+            self.suggestion_index[guild_id] = FuzzyIndex(suggestions)
+        
+        return self.suggestion_index[guild_id]
+    
+    def fuzzy_suggestion_search(self, suggestion, suggestion_index:FuzzyIndex):
+        return suggestion_index.search(suggestion)
     
     """ Listeners """
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, raw_reaction:discord.RawReactionActionEvent):
-        if raw_reaction.user_id == self.bot.user.id:
+        if raw_reaction.user_id == self.bot.user.id or raw_reaction.guild_id is None:
+            return
+        
+        # Drop reactions on any other message before anything is awaited (or any metrics are kept for the guild)
+        route = self.route_reaction(raw_reaction)
+        if route is None:
             return
         
-        vinfo = await self.get_vote_info(raw_reaction.guild_id)
+        metrics = self.metrics.guild(raw_reaction.guild_id)
+        metrics.incr("reaction_add_events")
+        
+        event_started = time.perf_counter()
+        
+        vinfo = await self.get_vote_info(*route)
         
         # Check that the react is on the proper message
         if not vinfo.check_msg_id(raw_reaction.message_id):
             return
         
         await vinfo.reaction_add_listener(raw_reaction)
+        
+        metrics.incr("vote_reaction_adds")
+        metrics.observe("reaction_add", time.perf_counter() - event_started)
     
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, raw_reaction:discord.RawReactionActionEvent):
-        if raw_reaction.user_id == self.bot.user.id:
+        if raw_reaction.user_id == self.bot.user.id or raw_reaction.guild_id is None:
+            return
+        
+        # Drop reactions on any other message before anything is awaited (or any metrics are kept for the guild)
+        route = self.route_reaction(raw_reaction)
+        if route is None:
             return
         
-        vinfo = await self.get_vote_info(raw_reaction.guild_id)
+        metrics = self.metrics.guild(raw_reaction.guild_id)
+        metrics.incr("reaction_remove_events")
+        
+        event_started = time.perf_counter()
+        
+        vinfo = await self.get_vote_info(*route)
         
         # Check that the react is on the proper message
         if not vinfo.check_msg_id(raw_reaction.message_id):
             return
         
         await vinfo.reaction_remove_listener(raw_reaction)
+        
+        metrics.incr("vote_reaction_removes")
+        metrics.observe("reaction_remove", time.perf_counter() - event_started)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, raw_clear:discord.RawReactionClearEvent):
+        if raw_clear.guild_id is None:
+            return
+        
+        # Every reaction on a vote message was removed (ie. by a mod), which clears the votes in one go
+        route = self.route_reaction(raw_clear)
+        if route is None:
+            return
+        
+        vinfo = await self.get_vote_info(*route)
+        if not vinfo.check_msg_id(raw_clear.message_id):
+            return
+        
+        await vinfo.reaction_clear_listener(raw_clear)
+        self.metrics.guild(raw_clear.guild_id).incr("vote_reaction_clears")
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, raw_clear:discord.RawReactionClearEmojiEvent):
+        if raw_clear.guild_id is None:
+            return
+        
+        # One option's reaction was removed from a vote message, which clears that option's votes in one go
+        route = self.route_reaction(raw_clear)
+        if route is None:
+            return
+        
+        vinfo = await self.get_vote_info(*route)
+        if not vinfo.check_msg_id(raw_clear.message_id):
+            return
+        
+        await vinfo.reaction_clear_emoji_listener(raw_clear)
+        self.metrics.guild(raw_clear.guild_id).incr("vote_reaction_clears")
     
     
     """Global Commands"""
@@ -128,23 +762,32 @@ class MovieNightCog(commands.Cog):
         if len(args) > 0:
             movie_title = movie_title + " " + " ".join(args)
         
-        async with self.config.guild(ctx.guild).suggestions() as suggestions:
+        vinfo = await self.get_vote_info(ctx.guild.id)
+        
+        async with self.settings.edit(ctx.guild.id) as settings:
+            suggestions = settings["suggestions"]
+            
             # Check that the max number of suggestions isn't reached
-            if len(suggestions) >= 20:
+            if len(suggestions) >= self.get_max_suggestions(settings):
                 await ctx.send("Maximum number of suggestions has already been reached!")
                 return
             
-            if movie_title in suggestions:
-                await ctx.send(f"\"**{movie_title}**\" is already in the list!")
+            # Titles that only differ by case or spacing are the same movie
+            suggestion_index = self.get_suggestion_index(ctx.guild.id, suggestions)
+            duplicate = suggestion_index.find_duplicate(movie_title)
+            if duplicate is not None:
+                await ctx.send(f"\"**{duplicate}**\" is already in the list!")
                 return
             else:
                 suggestions.append(movie_title)
+                suggestion_index.add(movie_title)
+                self.suggestion_pages.invalidate(ctx.guild.id)
                 await ctx.send(f"\"**{movie_title}**\" has been added to the list of movie suggestions.")
             
             # If a vote is on-going, add the suggestion to the vote list
-            vinfo = await self.get_vote_info(ctx.guild.id)
             if vinfo.is_voting_enabled():
                 await vinfo.add_voting_option(movie_title)
+                self.set_prev_vote(ctx.guild.id, settings, vinfo, settings["prev_vote_channel_id"])
     
     @commands.command(name="unsuggest")
     async def _cmd_del_suggestion(self, ctx: commands.Context, suggestion, *args):
@@ -169,20 +812,27 @@ class MovieNightCog(commands.Cog):
             # Index removal
             movie_index = movie_index - 1
             
-            async with self.config.guild(ctx.guild).suggestions() as suggestions:
+            async with self.settings.edit(ctx.guild.id) as settings:
+                suggestions = settings["suggestions"]
                 if movie_index < 0 or movie_index >= len(suggestions):
                     await ctx.send(f"That isn't a valid index, sorry! Please check the current list with: `{ctx.prefix}suggestions`.")
                 else:
                     movie_name = suggestions.pop(movie_index)
+                    self.get_suggestion_index(ctx.guild.id, suggestions).remove(movie_name)
+                    self.suggestion_pages.invalidate(ctx.guild.id)
                     await ctx.send(f"\"**{movie_name}**\" has been removed from the list of movie suggestions.")
         else:
             # Fuzzy search removal
-            async with self.config.guild(ctx.guild).suggestions() as suggestions:
-                search_result = self.fuzzy_suggestion_search(suggestion, suggestions)
+            async with self.settings.edit(ctx.guild.id) as settings:
+                suggestions = settings["suggestions"]
+                suggestion_index = self.get_suggestion_index(ctx.guild.id, suggestions)
+                search_result = self.fuzzy_suggestion_search(suggestion, suggestion_index)
                 
                 if search_result is not None:
                     try:
                         suggestions.remove(search_result)
+                        suggestion_index.remove(search_result)
+                        self.suggestion_pages.invalidate(ctx.guild.id)
                         await ctx.send(f"\"**{search_result}**\" has been removed from the list of movie suggestions.")
                     except ValueError:
                         await ctx.send(f"Error when removing matched movie title! `{suggestion} -> {search_result}`")
@@ -193,17 +843,42 @@ class MovieNightCog(commands.Cog):
     @commands.command(name="suggestions")
     async def _cmd_list_suggestions(self, ctx: commands.Context):
         """Lists all current movie suggestions."""
-        suggestions = await self.config.guild(ctx.guild).suggestions()
-        suggestions_list = [f"{ind}) {suggestions[ind-1]}\n" for ind in range(1, len(suggestions)+1)]
-        suggestions_str = "".join(suggestions_list)
+        suggestions = (await self.settings.get(ctx.guild.id))["suggestions"]
+        page = 0
+        msg = await ctx.send(embed=self.get_suggestions_embed(ctx.guild.id, suggestions, page))
         
-        em = discord.Embed(
-            title="**Movie Suggestions:**\n",
-            description=suggestions_str,
-            color=discord.Color.green()
-        )
+        if self.suggestion_pages.num_pages(suggestions) <= 1:
+            return
         
-        await ctx.send(embed=em)
+        # Only the page being looked at is ever formatted
+        for emoji in self.page_controls:
+            await msg.add_reaction(emoji)
+        
+        def check(reaction:discord.Reaction, user:discord.User) -> bool:
+            return reaction.message.id == msg.id and user.id == ctx.author.id and str(reaction.emoji) in self.page_controls
+        
+        while True:
+            try:
+                reaction, user = await self.bot.wait_for("reaction_add", check=check, timeout=self.page_timeout)
+            except asyncio.TimeoutError:
+                break
+            
+            # The list may have changed since the last page was shown
+            suggestions = (await self.settings.get(ctx.guild.id))["suggestions"]
+            step = -1 if str(reaction.emoji) == self.page_controls[0] else 1
+            page = (page + step) % self.suggestion_pages.num_pages(suggestions)
+            
+            await msg.edit(embed=self.get_suggestions_embed(ctx.guild.id, suggestions, page))
+            
+            try:
+                await msg.remove_reaction(reaction.emoji, user)
+            except (discord.Forbidden, discord.NotFound):
+                pass
+        
+        try:
+            await msg.clear_reactions()
+        except (discord.Forbidden, discord.NotFound, discord.HTTPException):
+            pass
     
     
     """Admin Commands"""
@@ -219,9 +894,21 @@ class MovieNightCog(commands.Cog):
             description = """\n
             **Commands**\n
             ``{0}mn clear_suggestions``: Clears the list of movie suggestions.\n
-            ``{0}mn start_vote``: Starts a vote for the next movie to watch.\n
+            ``{0}mn import``: Adds the suggestions in an attached JSON or CSV file.\n
+            ``{0}mn export [json/csv]``: Sends the list of movie suggestions as a file.\n
+            ``{0}mn start_vote [closes]``: Starts a vote for the next movie to watch, closing by itself after a duration (eg. 2h) or at movie_time if given.\n
             ``{0}mn stop_vote``: Stops the on-going vote for the next movie to watch.\n
             ``{0}mn cancel_vote``: Cancels the on-going vote.\n
+            ``{0}mn poll start <name> [option | option | ...]``: Starts a named poll alongside the movie vote, on the suggestions if no options are given.\n
+            ``{0}mn poll stop <name>``/``{0}mn poll cancel <name>``: Stops or cancels a poll.\n
+            ``{0}mn poll list``: Lists the on-going polls.\n
+            ``{0}mn auto_close <duration/movie_time/off>``: Sets when the on-going vote closes by itself.\n
+            ``{0}mn movie_time <cron>``: Sets the movie night schedule, eg. ``0 20 * * 5`` for Fridays at 8pm.\n
+            ``{0}mn timezone <timezone>``: Sets the timezone of the movie night schedule.\n
+            ``{0}mn stats``: Shows how the bot has been handling votes on this server.\n
+            ``{0}mn profile start [seconds]``/``{0}mn profile stop``: Profiles the bot's vote handling, and posts where the time went.\n
+            ``{0}mn sharded_votes <true/false>``: Allows votes to be split across several messages, for more than 20 suggestions.\n
+            ``{0}mn tally_mode <mode>``: Sets how the winner is picked: plurality, instant_runoff or borda.\n
             \n"""
             
             em = discord.Embed(
@@ -235,69 +922,424 @@ class MovieNightCog(commands.Cog):
     @_cmd_movie_night.command(name="clear_suggestions")
     async def _cmd_clear_suggestions(self, ctx: commands.Context):
         """Clears the suggestions list."""
-        async with self.config.guild(ctx.guild).suggestions() as suggestions:
+        async with self.settings.edit(ctx.guild.id) as settings:
+            suggestions = settings["suggestions"]
             suggestions.clear()
+            self.get_suggestion_index(ctx.guild.id, suggestions).clear()
+            self.suggestion_pages.invalidate(ctx.guild.id)
             await ctx.send("Suggestions list has been cleared!")
     
     @_cmd_movie_night.command(name="start_vote")
-    async def _cmd_start_vote(self, ctx: commands.Context):
-        """Starts a vote for choosing the next movie."""
+    async def _cmd_start_vote(self, ctx: commands.Context, closes:Optional[str]=None):
+        """Starts a vote for choosing the next movie, optionally closing by itself after a duration (eg. 2h) or at movie_time."""
         vinfo = await self.get_vote_info(ctx.guild.id)
         
-        suggestions = await self.config.guild(ctx.guild).suggestions()
+        # A copy, since the vote adds to its own list
+        settings = await self.settings.get(ctx.guild.id)
+        suggestions = list(settings["suggestions"])
         
         # Stop the vote if there are no suggestions
         if len(suggestions) <= 0:
             await ctx.send("Cannot run a vote with no suggestions.")
             return
         
+        deadline = None
+        if closes is not None:
+            try:
+                deadline = self.parse_vote_deadline(closes, settings)
+            except ValueError as e:
+                await ctx.send(str(e))
+                return
+        
         try:
-            vote_msg_id = await vinfo.start_vote(suggestions, ctx)
+            await vinfo.start_vote(suggestions, ctx)
         except VoteException as ve:
             await ctx.send(str(ve))
         else:
+            # The reactions are seeded as soon as the vote is posted, so it has to take votes before anything else is awaited
+            self.route_vote_msgs(ctx.guild.id, None, vinfo.get_msg_ids())
+            
             await ctx.send(
                 "@everyone Voting has started!",
                 allowed_mentions=discord.AllowedMentions.all()
             )
-            await self.config.guild(ctx.guild).prev_vote_msg_id.set(vote_msg_id)
+            async with self.settings.edit(ctx.guild.id) as settings:
+                self.set_prev_vote(ctx.guild.id, settings, vinfo, ctx.channel.id)
+                
+                if deadline is not None:
+                    settings["vote_deadline"] = deadline
+                    self.deadlines.schedule(ctx.guild.id, deadline)
+            
+            if deadline is not None:
+                await ctx.send(f"The vote closes <t:{int(deadline)}:R>.")
     
     @_cmd_movie_night.command(name="stop_vote")
     async def _cmd_stop_vote(self, ctx: commands.Context):
         """Stops the ongoing vote for the next movie (if any)."""
+        await self._stop_vote(ctx.guild, ctx)
+    
+    @_cmd_movie_night.command(name="cancel_vote")
+    async def _cmd_cancel_vote(self, ctx: commands.Context):
+        """Stops the ongoing vote for the next movie (if any)."""
+        self.deadlines.cancel(ctx.guild.id)
         vinfo = await self.get_vote_info(ctx.guild.id)
         try:
-            winner, bad_votes = await vinfo.stop_vote(ctx)
+            await vinfo.cancel_vote()
         except VoteException as ve:
             await ctx.send(str(ve))
         else:
-            async with self.config.guild(ctx.guild).suggestions() as suggestions:
-                try:
-                    # Remove the winner from the list and set it as the next movie title
-                    suggestions.remove(winner)
-                except ValueError:
-                    pass
-                
-                for x in bad_votes:
-                    try:
-                        # Also remove the "bad votes"
-                        suggestions.remove(x)
-                    except ValueError:
-                        pass
+            await ctx.send("Voting cancelled!")
+        finally:
+            async with self.settings.edit(ctx.guild.id) as settings:
+                self.clear_prev_vote(settings)
+    
+    @_cmd_movie_night.group(name="poll")
+    async def _cmd_poll(self, ctx: commands.Context):
+        """Runs named polls alongside the movie vote, eg. to pick a genre."""
+        pass
+    
+    @_cmd_poll.command(name="start")
+    async def _cmd_poll_start(self, ctx: commands.Context, name:str, *, options:str=""):
+        """Starts a poll on the given options (separated by |), or on the suggestions if there aren't any."""
+        name = name.lower()
+        if not _poll_name_re.match(name):
+            await ctx.send("Poll names can only have letters, numbers, - and _, and be at most 32 characters long.")
+            return
+        
+        settings = await self.settings.get(ctx.guild.id)
+        if self.find_poll(settings, name) is not None:
+            await ctx.send(f"A poll called **{name}** is already running!")
+            return
+        
+        if len(settings["polls"]) >= self.max_polls:
+            await ctx.send(f"At most {self.max_polls} polls can run at once.")
+            return
+        
+        choices = self.parse_poll_options(options) if options.strip() != "" else list(settings["suggestions"])
+        if len(choices) <= 0:
+            await ctx.send("Cannot run a poll with no options.")
+            return
+        
+        max_options = self.get_max_suggestions(settings)
+        if len(choices) > max_options:
+            await ctx.send(f"A poll can have at most {max_options} options.")
+            return
+        
+        vinfo = await self.get_vote_info(ctx.guild.id, name)
+        try:
+            await vinfo.start_vote(list(choices), ctx)
+        except VoteException as ve:
+            await ctx.send(str(ve))
+        else:
+            # As with the movie vote, the poll takes votes before anything else is awaited
+            self.route_vote_msgs(ctx.guild.id, name, vinfo.get_msg_ids())
+            
+            async with self.settings.edit(ctx.guild.id) as settings:
+                self.add_poll(ctx.guild.id, settings, name, vinfo, ctx.channel.id, choices)
             
-            await self.config.guild(ctx.guild).next_movie_title.set(winner)
+            await ctx.send(
+                f"@everyone The **{name}** poll has started!",
+                allowed_mentions=discord.AllowedMentions.all()
+            )
+    
+    @_cmd_poll.command(name="stop")
+    async def _cmd_poll_stop(self, ctx: commands.Context, name:str):
+        """Stops a poll and posts its results."""
+        name = name.lower()
+        settings = await self.settings.get(ctx.guild.id)
+        if self.find_poll(settings, name) is None:
+            await ctx.send(f"There's no poll called **{name}**!")
+            return
+        
+        vinfo = await self.get_vote_info(ctx.guild.id, name)
+        try:
+            await vinfo.stop_vote(ctx, settings["tally_mode"], show_removals=False)
+        except VoteException as ve:
+            await ctx.send(str(ve))
         finally:
-            await self.config.guild(ctx.guild).prev_vote_msg_id.set(-1)
+            async with self.settings.edit(ctx.guild.id) as settings:
+                self.remove_poll(settings, name)
     
-    @_cmd_movie_night.command(name="cancel_vote")
-    async def _cmd_cancel_vote(self, ctx: commands.Context):
-        """Stops the ongoing vote for the next movie (if any)."""
-        vinfo = await self.get_vote_info(ctx.guild.id)
+    @_cmd_poll.command(name="cancel")
+    async def _cmd_poll_cancel(self, ctx: commands.Context, name:str):
+        """Cancels a poll without posting any results."""
+        name = name.lower()
+        settings = await self.settings.get(ctx.guild.id)
+        if self.find_poll(settings, name) is None:
+            await ctx.send(f"There's no poll called **{name}**!")
+            return
+        
+        vinfo = await self.get_vote_info(ctx.guild.id, name)
         try:
             await vinfo.cancel_vote()
         except VoteException as ve:
             await ctx.send(str(ve))
         else:
-            await ctx.send("Voting cancelled!")
+            await ctx.send(f"The **{name}** poll has been cancelled!")
         finally:
-            await self.config.guild(ctx.guild).prev_vote_msg_id.set(-1)
+            async with self.settings.edit(ctx.guild.id) as settings:
+                self.remove_poll(settings, name)
+    
+    @_cmd_poll.command(name="list")
+    async def _cmd_poll_list(self, ctx: commands.Context):
+        """Lists the on-going polls."""
+        polls = (await self.settings.get(ctx.guild.id))["polls"]
+        if len(polls) == 0:
+            await ctx.send("No polls are running.")
+            return
+        
+        lines = [f"**{poll['name']}** in <#{poll['channel_id']}>, with {len(poll['options'])} options" for poll in polls]
+        await ctx.send("\n".join(lines))
+    
+    @_cmd_movie_night.command(name="import")
+    async def _cmd_import(self, ctx: commands.Context):
+        """Adds the suggestions in an attached JSON or CSV file, skipping any already in the list."""
+        if len(ctx.message.attachments) == 0:
+            await ctx.send("Attach a JSON or CSV file of suggestions to import.")
+            return
+        
+        attachment = ctx.message.attachments[0]
+        if attachment.size > self.max_import_bytes:
+            await ctx.send(f"The file is too big, it can be at most {self.max_import_bytes // 1024} KiB.")
+            return
+        
+        vinfo = await self.get_vote_info(ctx.guild.id)
+        if vinfo.is_voting_enabled():
+            await ctx.send("Cannot import suggestions while a vote is in progress!")
+            return
+        
+        try:
+            data = await attachment.read()
+        except (discord.NotFound, discord.HTTPException):
+            await ctx.send("Unable to download the attached file.")
+            return
+        
+        added = 0
+        duplicates = 0
+        over_max = 0
+        error = None
+        
+        # Everything is saved in one write once the file has been gone through
+        async with self.settings.edit(ctx.guild.id) as settings:
+            suggestions = settings["suggestions"]
+            suggestion_index = self.get_suggestion_index(ctx.guild.id, suggestions)
+            max_suggestions = self.get_max_suggestions(settings)
+            
+            try:
+                for title in parse_suggestions(data, attachment.filename):
+                    if suggestion_index.find_duplicate(title) is not None:
+                        duplicates += 1
+                    elif len(suggestions) >= max_suggestions:
+                        over_max += 1
+                    else:
+                        suggestions.append(title)
+                        suggestion_index.add(title)
+                        added += 1
+            except (ValueError, TypeError, csv.Error) as e:
+                error = e
+            
+            if added > 0:
+                self.suggestion_pages.invalidate(ctx.guild.id)
+        
+        result = f"Imported {added} suggestion(s), skipped {duplicates} already in the list."
+        if over_max > 0:
+            result += f"\n{over_max} suggestion(s) didn't fit, the list can hold at most {max_suggestions}."
+        if error is not None:
+            result += f"\nStopped early, the file couldn't be read: {error}"
+        
+        await ctx.send(result)
+    
+    @_cmd_movie_night.command(name="export")
+    async def _cmd_export(self, ctx: commands.Context, fmt:str="json"):
+        """Sends the list of suggestions as a JSON or CSV file."""
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            await ctx.send(f"Unknown format, it must be one of: {', '.join(EXPORT_FORMATS)}.")
+            return
+        
+        suggestions = (await self.settings.get(ctx.guild.id))["suggestions"]
+        data = dump_suggestions(suggestions, fmt)
+        await ctx.send(file=discord.File(io.BytesIO(data), filename=f"suggestions.{fmt}"))
+    
+    @_cmd_movie_night.command(name="auto_close")
+    async def _cmd_auto_close(self, ctx: commands.Context, closes:str):
+        """Sets the on-going vote to close by itself after a duration (eg. 2h), at movie_time, or never (off)."""
+        settings = await self.settings.get(ctx.guild.id)
+        if settings["prev_vote_msg_id"] <= 0:
+            await ctx.send("Voting hasn't started!")
+            return
+        
+        if closes.lower() == "off":
+            self.deadlines.cancel(ctx.guild.id)
+            async with self.settings.edit(ctx.guild.id) as settings:
+                settings["vote_deadline"] = -1
+            
+            await ctx.send("The vote will stay open until it's stopped.")
+            return
+        
+        try:
+            deadline = self.parse_vote_deadline(closes, settings)
+        except ValueError as e:
+            await ctx.send(str(e))
+            return
+        
+        async with self.settings.edit(ctx.guild.id) as settings:
+            settings["vote_deadline"] = deadline
+        
+        self.deadlines.schedule(ctx.guild.id, deadline)
+        await ctx.send(f"The vote closes <t:{int(deadline)}:R>.")
+    
+    @_cmd_movie_night.command(name="movie_time")
+    async def _cmd_movie_time(self, ctx: commands.Context, *, cron:str):
+        """Sets the movie night schedule as a cron expression (eg. 0 20 * * 5 for Fridays at 8pm)."""
+        settings = await self.settings.get(ctx.guild.id)
+        try:
+            next_time = next_cron_time(cron, settings["timezone_str"])
+        except ValueError as e:
+            await ctx.send(str(e))
+            return
+        
+        async with self.settings.edit(ctx.guild.id) as settings:
+            settings["movie_time"] = cron
+        
+        await ctx.send(f"Movie time set, the next one is <t:{int(next_time)}:F>.")
+    
+    @_cmd_movie_night.command(name="timezone")
+    async def _cmd_timezone(self, ctx: commands.Context, timezone_str:str):
+        """Sets the timezone the movie night schedule is in (eg. America/Toronto)."""
+        settings = await self.settings.get(ctx.guild.id)
+        try:
+            next_cron_time(settings["movie_time"], timezone_str)
+        except ValueError as e:
+            await ctx.send(str(e))
+            return
+        
+        async with self.settings.edit(ctx.guild.id) as settings:
+            settings["timezone_str"] = timezone_str
+        
+        await ctx.send(f"Timezone set to {timezone_str}.")
+    
+    @_cmd_movie_night.group(name="profile")
+    async def _cmd_profile(self, ctx: commands.Context):
+        """Profiles the Movie Night listeners, commands and background tasks, to find out where the time goes."""
+        pass
+    
+    @_cmd_profile.command(name="start")
+    async def _cmd_profile_start(self, ctx: commands.Context, seconds:int=60):
+        """Starts profiling for the given number of seconds, the hot spots are posted here once it's done."""
+        if seconds <= 0 or seconds > self.max_profile_seconds:
+            await ctx.send(f"Profiling can run for 1 to {self.max_profile_seconds} seconds.")
+            return
+        
+        if not self.profiler.start():
+            await ctx.send("Profiling is already running!")
+            return
+        
+        self._profile_task = asyncio.ensure_future(self._profile_window(ctx.channel, seconds))
+        await ctx.send(f"Profiling the Movie Night listeners, commands and background tasks for {seconds} seconds.")
+    
+    @_cmd_profile.command(name="stop")
+    async def _cmd_profile_stop(self, ctx: commands.Context):
+        """Stops profiling early and posts the hot spots."""
+        if not self.profiler.is_running():
+            await ctx.send("Profiling isn't running!")
+            return
+        
+        if self._profile_task is not None:
+            self._profile_task.cancel()
+            self._profile_task = None
+        
+        await self._send_profile_report(ctx.channel)
+    
+    @_cmd_movie_night.command(name="stats")
+    async def _cmd_stats(self, ctx: commands.Context):
+        """Shows runtime stats for this server's votes."""
+        stats = self.get_metrics(ctx.guild.id)
+        
+        em = discord.Embed(
+            title="**Movie Night Stats:**\n",
+            color=discord.Color.green()
+        )
+        
+        counters = [f"{name}: {count}" for name, count in sorted(stats["counters"].items())]
+        em.add_field(name="Counters", value="\n".join(counters) or "Nothing yet.", inline=False)
+        
+        latencies = [
+            f"{name}: {lat['count']} | p50 {lat['p50'] * 1000:.1f}ms | p99 {lat['p99'] * 1000:.1f}ms | max {lat['max'] * 1000:.1f}ms"
+            for name, lat in sorted(stats["latencies"].items())
+        ]
+        em.add_field(name="Latencies", value="\n".join(latencies) or "Nothing yet.", inline=False)
+        
+        if "render" in stats:
+            em.add_field(name="Vote message edits", value=f"sent: {stats['render']['edits_sent']}\nskipped: {stats['render']['edits_skipped']}", inline=False)
+        
+        cache = stats["vote_cache"]
+        cache_text = f"votes: {cache['votes']}/{cache['max_size']} ({cache['active_votes']} on-going)\nevictions: {cache['evictions']}\nmemory: {cache['bytes'] / 1024:.1f} KiB (largest {cache['largest_bytes'] / 1024:.1f} KiB)"
+        if "vote_bytes" in stats:
+            cache_text += f"\nthis server: {stats['vote_bytes'] / 1024:.1f} KiB"
+        
+        em.add_field(name="Vote cache", value=cache_text, inline=False)
+        
+        if "vote_store" in stats:
+            store = stats["vote_store"]
+            store_text = f"backend: {store['backend']}"
+            if "batches_written" in store:
+                store_text += f"\nbatches: {store['batches_written']}\nchanges: {store['changes_written']} ({store['changes_pending']} pending)"
+            
+            em.add_field(name="Vote store", value=store_text, inline=False)
+        
+        if "seeding" in stats:
+            seeding = stats["seeding"]
+            em.add_field(
+                name="Vote reactions",
+                value=f"added: {seeding['reactions_seeded']}\nretried: {seeding['reaction_retries']}\nfailed: {seeding['reaction_failures']}\npending: {seeding['reactions_pending']}",
+                inline=False
+            )
+        
+        await ctx.send(embed=em)
+    
+    @_cmd_movie_night.command(name="sharded_votes")
+    async def _cmd_sharded_votes(self, ctx: commands.Context, enabled:bool):
+        """Sets whether votes can be split across several messages, allowing more than 20 suggestions."""
+        async with self.settings.edit(ctx.guild.id) as settings:
+            settings["sharded_votes"] = enabled
+        
+        if enabled:
+            await ctx.send(f"Sharded votes enabled, up to {20 * self.max_vote_shards} suggestions can be added.")
+        else:
+            await ctx.send("Sharded votes disabled, up to 20 suggestions can be added.")
+    
+    @_cmd_movie_night.command(name="tally_mode")
+    async def _cmd_tally_mode(self, ctx: commands.Context, mode:str):
+        """Sets how the winner of a vote is picked: plurality, instant_runoff or borda."""
+        mode = mode.lower()
+        if mode not in TALLY_MODES:
+            await ctx.send(f"Unknown tally mode, it must be one of: {', '.join(TALLY_MODES)}.")
+            return
+        
+        async with self.settings.edit(ctx.guild.id) as settings:
+            settings["tally_mode"] = mode
+        
+        if mode == "plurality":
+            await ctx.send("Votes will be won by the option with the most votes.")
+        else:
+            await ctx.send(f"Votes will be won by {mode.replace('_', ' ')}, the order each user reacts in is their order of preference.")
+    
+    @_cmd_movie_night.command(name="vote_store")
+    @checks.is_owner()
+    async def _cmd_vote_store(self, ctx: commands.Context, backend:str):
+        """Sets where vote tallies are kept: memory, or sqlite to share them between the bot's processes. Takes effect once the cog is reloaded."""
+        backend = backend.lower()
+        if backend not in VOTE_STORES:
+            await ctx.send(f"Unknown vote store, it must be one of: {', '.join(VOTE_STORES)}.")
+            return
+        
+        await self.config.vote_store.set(backend)
+        await ctx.send(f"Vote tallies will be kept in {backend} once the cog is reloaded.")
+    
+    @_cmd_movie_night.command(name="warm_restore")
+    @checks.is_owner()
+    async def _cmd_warm_restore(self, ctx: commands.Context, enabled:bool):
+        """Sets whether on-going votes are restored as soon as the bot starts, instead of on the first reaction."""
+        await self.config.warm_restore.set(enabled)
+        await ctx.send(f"Restoring votes on startup has been {'enabled' if enabled else 'disabled'}.")
@@ -0,0 +1,171 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+
+from typing import Any, Awaitable, Callable, Generator, List, Optional
+
+# The capture that's running (if any), so background tasks started deep inside a vote can join it
+_capture = None
+
+class _CoroutineTimes:
+    """Wall-clock time of a profiled coroutine, split into time spent running and time spent awaiting"""
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.running = 0.0
+    
+    def awaiting(self) -> float:
+        return max(0.0, self.wall - self.running)
+
+class _ProfiledCoroutine:
+    """
+    Drives a coroutine with the profiler only enabled while the coroutine itself is running,
+    so time spent awaiting Discord (or running other tasks) isn't counted in the hot spots, only in its timings
+    """
+    def __init__(self, coro:Awaitable, profiler:"CogProfiler", times:_CoroutineTimes):
+        self._coro = coro
+        self._profiler = profiler
+        self._profile = profiler._profile
+        self._times = times
+    
+    def __await__(self) -> Generator[Any, Any, Any]:
+        coro = self._coro.__await__()
+        value = None
+        error = None
+        
+        self._times.calls += 1
+        started = time.perf_counter()
+        
+        try:
+            while True:
+                # A capture stopped part way through a coroutine isn't added to anymore
+                profiling = self._profiler._profile is self._profile
+                
+                step_started = time.perf_counter()
+                if profiling:
+                    self._profile.enable()
+                
+                try:
+                    if error is not None:
+                        yielded = coro.throw(error)
+                    else:
+                        yielded = coro.send(value)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    if profiling:
+                        self._profile.disable()
+                        self._times.running += time.perf_counter() - step_started
+                
+                try:
+                    value = yield yielded
+                    error = None
+                except BaseException as e:
+                    value = None
+                    error = e
+        finally:
+            if self._profiler._profile is self._profile:
+                self._times.wall += time.perf_counter() - started
+
+class CogProfiler:
+    """On-demand cProfile capture of the cog's listeners, commands and background tasks, which only costs a None check while it's off"""
+    def __init__(self):
+        self._profile = None
+        self._started = 0.0
+        self._times = {}    # qualified name -> _CoroutineTimes
+    
+    def wrap(self, func:Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Wraps a listener or command callback so it's profiled while a capture is running"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if self._profile is None:
+                return await func(*args, **kwargs)
+            
+            return await self.run(func(*args, **kwargs), func.__qualname__)
+        
+        return wrapper
+    
+    def run(self, coro:Awaitable, name:str) -> Awaitable:
+        """Profiles the coroutine, its timings are reported under the given name"""
+        if name not in self._times:
+            self._times[name] = _CoroutineTimes()
+        
+        return _ProfiledCoroutine(coro, self, self._times[name])
+    
+    def is_running(self) -> bool:
+        return self._profile is not None
+    
+    def start(self) -> bool:
+        """Starts a capture, returns False if one is already running"""
+        global _capture
+        if self._profile is not None:
+            return False
+        
+        self._profile = cProfile.Profile()
+        self._started = time.monotonic()
+        self._times = {}
+        _capture = self
+        return True
+    
+    def stop(self, limit:int=30) -> Optional[str]:
+        """Stops the capture and returns a report of its top hot spots, or None if nothing was running"""
+        global _capture
+        profile = self._profile
+        if profile is None:
+            return None
+        
+        self._profile = None
+        profile.disable()
+        if _capture is self:
+            _capture = None
+        
+        out = io.StringIO()
+        out.write(f"Movie Night profile, {time.monotonic() - self._started:.1f}s of listeners, commands and background tasks\n\n")
+        
+        out.write("Wall-clock time per coroutine, awaiting is time spent suspended (eg. on Discord, on disk, or sleeping between batches):\n")
+        out.write("\n".join(self._format_times()) + "\n\n")
+        
+        try:
+            stats = pstats.Stats(profile, stream=out)
+        except TypeError:
+            # Nothing ran while the capture was on
+            out.write("Nothing was captured.\n")
+            return out.getvalue()
+        
+        stats.strip_dirs()
+        
+        out.write("Sorted by total time in the function itself (time awaiting isn't included):\n")
+        stats.sort_stats("tottime").print_stats(limit)
+        
+        out.write("Sorted by cumulative time, including the functions it calls:\n")
+        stats.sort_stats("cumulative").print_stats(limit)
+        
+        return out.getvalue()
+    
+    """ Private methods """
+    
+    def _format_times(self) -> List[str]:
+        times = sorted(self._times.items(), key=lambda item: item[1].wall, reverse=True)
+        if len(times) == 0:
+            return ["Nothing was awaited."]
+        
+        width = max(len(name) for name, _ in times)
+        lines = [f"{'coroutine':<{width}}  {'calls':>7}  {'wall':>10}  {'running':>10}  {'awaiting':>10}"]
+        for name, entry in times:
+            lines.append(f"{name:<{width}}  {entry.calls:>7}  {entry.wall:>9.3f}s  {entry.running:>9.3f}s  {entry.awaiting():>9.3f}s")
+        
+        return lines
+
+def profiled(func:Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Decorates a background task's coroutine method so it's profiled while any capture is running, under the class it ran on"""
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        capture = _capture
+        if capture is None:
+            return await func(self, *args, **kwargs)
+        
+        return await capture.run(func(self, *args, **kwargs), f"{type(self).__name__}.{func.__name__}")
+    
+    return wrapper
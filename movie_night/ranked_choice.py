@@ -0,0 +1,70 @@
+import numpy as np
+
+from typing import List, Tuple
+from .tally import VoteTally
+
+# How the winner of a vote is picked
+# plurality: the most votes wins
+# instant_runoff: ranked choice, the option with the fewest first choices is eliminated until one has a majority
+# borda: ranked choice, each ballot gives an option a point for every option ranked below it
+TALLY_MODES = ("plurality", "instant_runoff", "borda")
+
+def ballot_matrix(tally:VoteTally) -> np.ndarray:
+    """
+    Returns the ballots as a dense (voters x options) matrix of arrival stamps, 0 where there's no vote,
+    a user's earlier votes are their higher preferences, users with no votes left are dropped
+    """
+    num_voters = tally.num_voters()
+    ballots = np.zeros((tally.num_options(), num_voters), dtype=np.uintc)
+    for option in range(tally.num_options()):
+        # The stamps grow ahead of the voters, and can be shorter for options added part way through
+        stamps = tally.stamps(option)
+        filled = min(len(stamps), num_voters)
+        if filled > 0:
+            ballots[option, :filled] = np.frombuffer(stamps, dtype=np.uintc)[:filled]
+    
+    ballots = ballots.T
+    return ballots[ballots.any(axis=1)]
+
+def instant_runoff(ballots:np.ndarray) -> Tuple[List[int], int]:
+    """
+    Runs instant runoff rounds over the ballots,
+    returns the winning option (or all the options still tied when no more can be eliminated) and its votes in the last round
+    """
+    num_options = ballots.shape[1]
+    unranked = np.iinfo(ballots.dtype).max
+    ranked = np.where(ballots > 0, ballots, unranked)
+    
+    active = np.ones(num_options, dtype=bool)
+    while True:
+        # Each ballot counts for its highest preference that hasn't been eliminated
+        current = np.where(active, ranked, unranked)
+        first = current.argmin(axis=1)
+        counted = current[np.arange(len(current)), first] != unranked
+        counts = np.bincount(first[counted], minlength=num_options)
+        
+        best = int(counts[active].max())
+        if best * 2 > int(counted.sum()):
+            return [int(np.argmax(np.where(active, counts, -1)))], best
+        
+        # Eliminate every option tied for the fewest votes, unless that would eliminate them all
+        losers = active & (counts == counts[active].min())
+        if losers.sum() == active.sum():
+            return [int(option) for option in np.flatnonzero(active)], best
+        
+        active &= ~losers
+
+def borda(ballots:np.ndarray) -> Tuple[List[int], int]:
+    """Scores the ballots with a Borda count, returns the options with the most points and their points"""
+    num_voters, num_options = ballots.shape
+    unranked = np.iinfo(ballots.dtype).max
+    ranked = np.where(ballots > 0, ballots, unranked)
+    
+    # 0 based preference of each option on each ballot
+    order = np.argsort(ranked, axis=1, kind="stable")
+    preference = np.empty_like(order)
+    preference[np.arange(num_voters)[:, None], order] = np.arange(num_options)
+    
+    points = np.where(ballots > 0, num_options - 1 - preference, 0).sum(axis=0)
+    best = int(points.max())
+    return [int(option) for option in np.flatnonzero(points == best)], best
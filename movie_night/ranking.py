@@ -0,0 +1,78 @@
+from typing import Hashable, List
+
+class VoteRanking:
+    """Keeps vote options ordered by their number of votes, using buckets of options with the same vote count"""
+    def __init__(self):
+        self._order = {}    # option -> position it was added in (breaks ties, like a stable sort)
+        self._counts = {}   # option -> number of votes
+        self._buckets = {}  # number of votes -> options with that many votes
+        self._max = 0
+    
+    def add_option(self, key:Hashable) -> None:
+        if key in self._counts:
+            return
+        
+        self._order[key] = len(self._order)
+        self._counts[key] = 0
+        self._buckets.setdefault(0, {})[key] = None
+    
+    def increment(self, key:Hashable, amount:int=1) -> None:
+        self._move(key, amount)
+    
+    def decrement(self, key:Hashable, amount:int=1) -> None:
+        self._move(key, -amount)
+    
+    def clear(self) -> None:
+        self._order = {}
+        self._counts = {}
+        self._buckets = {}
+        self._max = 0
+    
+    def count(self, key:Hashable) -> int:
+        return self._counts[key]
+    
+    def max_count(self) -> int:
+        return self._max
+    
+    def leaders(self) -> List[Hashable]:
+        """Returns the option(s) with the most votes, more than one means there is a tie"""
+        return self._bucket_list(self._max)
+    
+    def at_most(self, num_votes:int) -> List[Hashable]:
+        """Returns the options with num_votes or fewer votes, most votes first"""
+        counts = sorted((c for c in self._buckets if c <= num_votes), reverse=True)
+        return [key for c in counts for key in self._bucket_list(c)]
+    
+    def ranked(self) -> List[Hashable]:
+        """Returns every option, most votes first"""
+        return self.at_most(self._max)
+    
+    def __len__(self) -> int:
+        return len(self._counts)
+    
+    """ Private methods """
+    
+    def _move(self, key:Hashable, delta:int) -> None:
+        count = self._counts[key]
+        new_count = count + delta
+        if new_count < 0 or delta == 0:
+            return
+        
+        bucket = self._buckets[count]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self._buckets[count]
+        
+        self._buckets.setdefault(new_count, {})[key] = None
+        self._counts[key] = new_count
+        
+        if new_count > self._max:
+            self._max = new_count
+        elif count == self._max and count not in self._buckets:
+            # The last option with the most votes lost one, so it's still in the lead,
+            # but one that lost several at once (ie. its reaction was cleared) may have dropped below others
+            self._max = new_count if delta == -1 else max(self._buckets)
+    
+    def _bucket_list(self, num_votes:int) -> List[Hashable]:
+        bucket = self._buckets.get(num_votes, {})
+        return sorted(bucket, key=self._order.__getitem__)
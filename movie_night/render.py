@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+from typing import Awaitable, Callable, Dict
+
+from .profiler import profiled
+
+log = logging.getLogger("red.mogs.movie_night")
+
+class RenderScheduler:
+    """Coalesces bursts of render requests into at most one render per interval"""
+    def __init__(self, render:Callable[[], Awaitable[None]], interval:float=1.5):
+        self.interval = interval
+        
+        self.edits_sent = 0
+        self.edits_skipped = 0
+        
+        self._render = render
+        self._dirty = False
+        self._last_render = 0.0
+        self._task = None
+    
+    def request(self) -> None:
+        """Marks the rendered output as stale, and schedules a render if one isn't already pending"""
+        was_dirty = self._dirty
+        self._dirty = True
+        
+        if self.is_pending():
+            # Only a change merged into a render that hasn't started yet saves an edit,
+            # one made while an edit is being sent needs another edit after it
+            if was_dirty:
+                self.edits_skipped += 1
+            return
+        
+        self._task = asyncio.ensure_future(self._run())
+    
+    async def flush(self) -> None:
+        """Cancels the pending render (if any) and renders right away if there are unsent changes"""
+        self.cancel()
+        
+        if self._dirty:
+            await self._do_render()
+    
+    def cancel(self) -> None:
+        """Cancels the pending render (if any), leaving unsent changes marked as stale"""
+        if self.is_pending():
+            self._task.cancel()
+        
+        self._task = None
+    
+    def reset(self) -> None:
+        """Cancels the pending render (if any) and forgets about unsent changes"""
+        self.cancel()
+        self._dirty = False
+    
+    def is_pending(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "edits_sent": self.edits_sent,
+            "edits_skipped": self.edits_skipped
+        }
+    
+    """ Private methods """
+    
+    @profiled
+    async def _run(self) -> None:
+        # Keep going until there's nothing left to send, changes that come in
+        # while we're waiting (or rendering) are picked up on the next pass
+        while self._dirty:
+            delay = self._last_render + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            try:
+                await self._do_render()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Failed to render the vote message")
+                return
+    
+    async def _do_render(self) -> None:
+        self._dirty = False
+        self._last_render = time.monotonic()
+        
+        try:
+            await self._render()
+        except asyncio.CancelledError:
+            # The render never made it out, so the changes are still unsent
+            self._dirty = True
+            raise
+        
+        self.edits_sent += 1
@@ -0,0 +1,107 @@
+import asyncio
+import discord
+import logging
+import time
+
+from collections import deque
+from typing import Dict, Iterable
+
+from .profiler import profiled
+
+log = logging.getLogger("red.mogs.movie_night")
+
+class ReactionSeeder:
+    """Adds the bot's reactions to vote messages in the background, in order and spaced out to stay under the rate limit"""
+    def __init__(self, spacing:float=0.25, retries:int=3, retry_delay:float=1.0):
+        self.spacing = spacing
+        self.retries = retries
+        self.retry_delay = retry_delay
+        
+        self.reactions_seeded = 0
+        self.reaction_retries = 0
+        self.reaction_failures = 0
+        
+        self._queue = deque()   # (message, emoji) still to be added
+        self._last_sent = 0.0
+        self._task = None
+        self._done = asyncio.Event()
+        self._done.set()
+    
+    def seed(self, msg:discord.Message, emojis:Iterable[str]) -> None:
+        """Queues reactions to be added to a message after everything queued before them"""
+        for emoji in emojis:
+            self._queue.append((msg, emoji))
+        
+        if len(self._queue) > 0 and not self.is_seeding():
+            self._done.clear()
+            self._task = asyncio.ensure_future(self._run())
+    
+    async def wait(self) -> None:
+        """Waits until every queued reaction has been added (or given up on)"""
+        await self._done.wait()
+    
+    def cancel(self) -> None:
+        """Drops any reactions that haven't been added yet"""
+        if self.is_seeding():
+            self._task.cancel()
+        
+        self._task = None
+        self._queue.clear()
+        self._done.set()
+    
+    def is_seeding(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "reactions_seeded": self.reactions_seeded,
+            "reaction_retries": self.reaction_retries,
+            "reaction_failures": self.reaction_failures,
+            "reactions_pending": len(self._queue)
+        }
+    
+    """ Private methods """
+    
+    @profiled
+    async def _run(self) -> None:
+        try:
+            while len(self._queue) > 0:
+                msg, emoji = self._queue[0]
+                
+                delay = self._last_sent + self.spacing - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                
+                await self._add_reaction(msg, emoji)
+                self._queue.popleft()
+            
+            log.debug("Finished seeding the vote reactions")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Failed to seed the vote reactions")
+            self._queue.clear()
+        finally:
+            if len(self._queue) == 0:
+                self._done.set()
+    
+    async def _add_reaction(self, msg:discord.Message, emoji:str) -> None:
+        for attempt in range(self.retries + 1):
+            self._last_sent = time.monotonic()
+            try:
+                await msg.add_reaction(emoji)
+                self.reactions_seeded += 1
+                return
+            except (discord.Forbidden, discord.NotFound):
+                # Retrying won't help, the message is gone or we aren't allowed to react
+                break
+            except discord.HTTPException:
+                if attempt == self.retries:
+                    break
+                
+                # Most likely a hiccup on Discord's end, back off and try again
+                self.reaction_retries += 1
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        
+        self.reaction_failures += 1
+        log.warning("Failed to add the %s reaction to vote message %s", emoji, msg.id)
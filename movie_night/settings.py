@@ -0,0 +1,53 @@
+import asyncio
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from redbot.core import Config
+
+class GuildSettingsCache:
+    """
+    Write-through cache of the guild settings stored in Config,
+    reads are served from memory and each edit is saved with a single write
+    """
+    def __init__(self, config:Config):
+        self.config = config
+        
+        self._settings = {}
+        self._locks = {}
+    
+    async def get(self, guild_id:int) -> Dict:
+        """Returns the cached settings for a guild, these should only be changed through edit()"""
+        if guild_id not in self._settings:
+            async with self._lock(guild_id):
+                await self._load(guild_id)
+        
+        return self._settings[guild_id]
+    
+    @asynccontextmanager
+    async def edit(self, guild_id:int) -> AsyncIterator[Dict]:
+        """
+        Yields the cached settings for a guild to be changed in place,
+        all the changes are saved to Config in one write once the block is done
+        """
+        async with self._lock(guild_id):
+            settings = await self._load(guild_id)
+            
+            try:
+                yield settings
+            finally:
+                # The cache has already been changed, so save even if the block failed part way through
+                await self.config.guild_from_id(guild_id).set(settings)
+    
+    """ Private methods """
+    
+    def _lock(self, guild_id:int) -> asyncio.Lock:
+        if guild_id not in self._locks:
+            self._locks[guild_id] = asyncio.Lock()
+        
+        return self._locks[guild_id]
+    
+    async def _load(self, guild_id:int) -> Dict:
+        if guild_id not in self._settings:
+            self._settings[guild_id] = await self.config.guild_from_id(guild_id).all()
+        
+        return self._settings[guild_id]
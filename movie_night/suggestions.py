@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+
+from typing import Iterator, List
+
+EXPORT_FORMATS = ("json", "csv")
+
+def parse_suggestions(data:bytes, filename:str) -> Iterator[str]:
+    """
+    Yields the titles in a JSON or CSV file, one at a time
+    JSON can be a list of titles or of objects with a "title", CSV uses the first column (and skips a "title" header)
+    """
+    text = data.decode("utf-8-sig")
+    
+    if filename.lower().endswith(".json"):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON list of titles")
+        
+        for item in items:
+            title = item.get("title", "") if isinstance(item, dict) else item
+            if isinstance(title, str) and title.strip() != "":
+                yield " ".join(title.split())
+        return
+    
+    for i, row in enumerate(csv.reader(io.StringIO(text))):
+        if len(row) == 0:
+            continue
+        
+        title = " ".join(row[0].split())
+        if i == 0 and title.lower() == "title":
+            continue
+        
+        if title != "":
+            yield title
+
+def dump_suggestions(titles:List[str], fmt:str) -> bytes:
+    """Writes the titles out as a JSON list, or a CSV with a "title" header"""
+    if fmt == "json":
+        return json.dumps(titles, indent=2, ensure_ascii=False).encode("utf-8")
+    
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["title"])
+    for title in titles:
+        writer.writerow([title])
+    
+    return out.getvalue().encode("utf-8")
+
+class SuggestionPages:
+    """
+    Rendered pages of each guild's suggestion list, a page is only formatted the first time it's shown
+    and is reused until the guild's list changes
+    """
+    def __init__(self, page_size:int=15, max_title_length:int=120):
+        # Small enough pages (and short enough titles) to always fit in an embed
+        self.page_size = page_size
+        self.max_title_length = max_title_length
+        
+        self._pages = {}    # guild id -> page number -> rendered page
+    
+    def num_pages(self, suggestions:List[str]) -> int:
+        return max(1, -(-len(suggestions) // self.page_size))
+    
+    def page(self, guild_id:int, suggestions:List[str], page:int) -> str:
+        pages = self._pages.setdefault(guild_id, {})
+        if page not in pages:
+            pages[page] = self._render(suggestions, page)
+        
+        return pages[page]
+    
+    def invalidate(self, guild_id:int) -> None:
+        """Drops a guild's rendered pages, must be called whenever its suggestion list changes"""
+        self._pages.pop(guild_id, None)
+    
+    """ Private methods """
+    
+    def _render(self, suggestions:List[str], page:int) -> str:
+        start = page * self.page_size
+        lines = []
+        for ind in range(start, min(start + self.page_size, len(suggestions))):
+            title = suggestions[ind]
+            if len(title) > self.max_title_length:
+                title = title[:self.max_title_length - 1] + "…"
+            
+            lines.append(f"{ind + 1}) {title}\n")
+        
+        return "".join(lines)
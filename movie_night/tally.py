@@ -0,0 +1,162 @@
+import sys
+
+from array import array
+from typing import Iterable, Iterator, List, Tuple
+
+class VoteTally:
+    """
+    Compact vote storage, options are integer indices and voter ids are interned to dense slots,
+    each option stamps the slots that voted for it with the order the vote arrived in (0 for no vote),
+    and keeps a running count
+    
+    This is the in-memory store for a vote's state, kept only by this process,
+    backends that share it (see votestore.py) subclass it and write the changes through
+    """
+    def __init__(self):
+        self._voter_slots = {}          # user id -> slot
+        self._voter_ids = array('Q')    # slot -> user id
+        self._stamps = []               # option -> array of arrival stamps, indexed by slot
+        self._counts = array('L')       # option -> number of votes
+        self._clock = 0                 # last arrival stamp handed out
+    
+    def add_option(self) -> int:
+        self._stamps.append(array('I', [0]) * len(self._voter_ids))
+        self._counts.append(0)
+        return len(self._stamps) - 1
+    
+    def add(self, option:int, uid:int) -> bool:
+        """Adds a vote, returns False if the user had already voted for the option"""
+        slot = self._intern(uid)
+        stamps = self._grow(option, slot)
+        
+        if stamps[slot]:
+            return False
+        
+        # A user's earlier votes rank above their later ones in the ranked tally modes
+        self._clock += 1
+        stamps[slot] = self._clock
+        self._counts[option] += 1
+        return True
+    
+    def add_many(self, option:int, uids:Iterable[int]) -> int:
+        """Adds the votes of several users for the same option, returns how many were new"""
+        added = 0
+        for uid in uids:
+            if self.add(option, uid):
+                added += 1
+        
+        return added
+    
+    def remove(self, option:int, uid:int) -> bool:
+        """Removes a vote, returns False if there was no vote to remove"""
+        slot = self._voter_slots.get(uid)
+        if slot is None:
+            return False
+        
+        stamps = self._stamps[option]
+        if slot >= len(stamps) or not stamps[slot]:
+            return False
+        
+        stamps[slot] = 0
+        self._counts[option] -= 1
+        return True
+    
+    def clear_option(self, option:int) -> int:
+        """Removes every vote for an option at once, returns how many there were"""
+        removed = self._counts[option]
+        
+        # The option grows back as it's voted on again, like one added part way through
+        self._stamps[option] = array('I')
+        self._counts[option] = 0
+        return removed
+    
+    def has_vote(self, option:int, uid:int) -> bool:
+        slot = self._voter_slots.get(uid)
+        stamps = self._stamps[option]
+        return slot is not None and slot < len(stamps) and stamps[slot] != 0
+    
+    def count(self, option:int) -> int:
+        return self._counts[option]
+    
+    def voters(self, option:int) -> Iterator[int]:
+        """Yields the ids of the users who voted for an option"""
+        voter_ids = self._voter_ids
+        for slot, stamp in enumerate(self._stamps[option]):
+            if stamp:
+                yield voter_ids[slot]
+    
+    def stamps(self, option:int) -> array:
+        """
+        Returns the arrival stamps of an option's votes, indexed by voter slot (0 for no vote),
+        it may be shorter than the number of voters and must not be changed
+        """
+        return self._stamps[option]
+    
+    def votes_in_order(self) -> List[Tuple[int, int]]:
+        """Returns every vote as (option, user id), in the order they arrived"""
+        votes = []
+        voter_ids = self._voter_ids
+        for option, stamps in enumerate(self._stamps):
+            for slot, stamp in enumerate(stamps):
+                if stamp:
+                    votes.append((stamp, option, voter_ids[slot]))
+        
+        votes.sort()
+        return [(option, uid) for _, option, uid in votes]
+    
+    def num_options(self) -> int:
+        return len(self._stamps)
+    
+    def num_voters(self) -> int:
+        """Number of users seen so far (including any who have since taken their votes back)"""
+        return len(self._voter_ids)
+    
+    def memory_footprint(self) -> int:
+        """Rough size of the tally in bytes, the user ids interned as dict keys aren't counted"""
+        return (
+            sys.getsizeof(self._voter_slots)
+            + sys.getsizeof(self._voter_ids)
+            + sys.getsizeof(self._stamps)
+            + sum(sys.getsizeof(stamps) for stamps in self._stamps)
+            + sys.getsizeof(self._counts)
+        )
+    
+    def clear(self) -> None:
+        self._voter_slots = {}
+        self._voter_ids = array('Q')
+        self._stamps = []
+        self._counts = array('L')
+        self._clock = 0
+    
+    """ Backing store hooks, there's no store behind the in-memory tally so these do nothing """
+    
+    def set_recording(self, recording:bool) -> None:
+        """Sets whether changes are written to the backing store, they aren't while a vote is replayed from its log"""
+        pass
+    
+    async def load(self) -> bool:
+        """Replaces the votes with the backing store's, returns False if they weren't replaced"""
+        return False
+    
+    async def flush(self) -> None:
+        """Waits until every change so far is in the backing store"""
+        pass
+    
+    """ Private methods """
+    
+    def _intern(self, uid:int) -> int:
+        slot = self._voter_slots.get(uid)
+        if slot is None:
+            slot = len(self._voter_ids)
+            self._voter_slots[uid] = slot
+            self._voter_ids.append(uid)
+        
+        return slot
+    
+    def _grow(self, option:int, slot:int) -> array:
+        # Options only grow to fit the voters that actually vote for them, doubling to keep appends cheap
+        stamps = self._stamps[option]
+        if slot >= len(stamps):
+            stamps.frombytes(bytes((max(slot + 1, len(stamps) * 2) - len(stamps)) * stamps.itemsize))
+        
+        return stamps
@@ -0,0 +1,88 @@
+import time
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from .voteinfo import VoteInfo
+
+class VoteInfoCache:
+    """
+    VoteInfo objects keyed by guild id (or by guild id and poll name), least recently used first,
+    votes that aren't on-going are evicted once there are too many or they've sat idle too long
+    """
+    def __init__(self, max_size:int=512, idle_timeout:float=3600.0, on_evict:Optional[Callable[[Hashable, VoteInfo], None]]=None):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict    # called with each evicted key and vote, to let go of anything kept alongside it
+        
+        self.evictions = 0
+        
+        self._entries = OrderedDict()   # key -> (VoteInfo, last used)
+    
+    def get(self, key:Hashable) -> Optional[VoteInfo]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        self._entries[key] = (entry[0], time.monotonic())
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def __getitem__(self, key:Hashable) -> VoteInfo:
+        vinfo = self.get(key)
+        if vinfo is None:
+            raise KeyError(key)
+        
+        return vinfo
+    
+    def __setitem__(self, key:Hashable, vinfo:VoteInfo) -> None:
+        self._entries[key] = (vinfo, time.monotonic())
+        self._entries.move_to_end(key)
+        self.evict(keep=key)
+    
+    def __contains__(self, key:Hashable) -> bool:
+        return key in self._entries
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def items(self) -> Iterator[Tuple[Hashable, VoteInfo]]:
+        return ((key, entry[0]) for key, entry in self._entries.items())
+    
+    def evict(self, keep:Optional[Hashable]=None) -> int:
+        """Drops idle votes, then the least recently used ones until the cache fits, returns how many were dropped"""
+        cutoff = time.monotonic() - self.idle_timeout
+        overflow = len(self._entries) - self.max_size
+        
+        evicted = []
+        for key, (vinfo, last_used) in self._entries.items():
+            if overflow <= 0 and last_used > cutoff:
+                # Everything after this was used more recently
+                break
+            
+            # Never drop an on-going vote, it would have to be restored on the next reaction
+            if vinfo.is_voting_enabled() or key == keep:
+                continue
+            
+            evicted.append(key)
+            overflow -= 1
+        
+        for key in evicted:
+            vinfo, _ = self._entries.pop(key)
+            if self.on_evict is not None:
+                self.on_evict(key, vinfo)
+        
+        self.evictions += len(evicted)
+        return len(evicted)
+    
+    def footprint(self) -> Dict:
+        """Returns the number of cached votes and roughly how much memory they take up, in bytes"""
+        sizes = [entry[0].get_memory_footprint() for entry in self._entries.values()]
+        return {
+            "votes": len(self._entries),
+            "active_votes": sum(1 for entry in self._entries.values() if entry[0].is_voting_enabled()),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "bytes": sum(sizes),
+            "largest_bytes": max(sizes, default=0)
+        }
@@ -1,8 +1,21 @@
+import asyncio
 import discord
+import logging
 import random
+import sys
+import time
 
-from typing import List, Tuple, Dict, Optional
-from functools import cmp_to_key
+from typing import Awaitable, Callable, List, Tuple, Dict, Optional, Union
+
+from .eventlog import VoteEventLog
+from .metrics import GuildMetrics
+from .ranked_choice import TALLY_MODES, ballot_matrix, borda, instant_runoff
+from .ranking import VoteRanking
+from .render import RenderScheduler
+from .seeder import ReactionSeeder
+from .tally import VoteTally
+
+log = logging.getLogger("red.mogs.movie_night")
 
 alphabet = 'a,b,c,d,e,f,g,h,i,j,k,l,m,n,o,p,q,r,s,t,u,v,w,x,y,z'.split(',')
 alphaset = set(alphabet)
@@ -11,22 +24,77 @@ alpha_to_num = {alphabet[i]: i for i in range(len(alphabet))}
 class VoteException(Exception):
     pass
 
+class VoteMessageLost(VoteException):
+    """One of the vote messages was deleted, so the vote has been ended"""
+    pass
+
+class VoteShard:
+    """One of the messages a vote is split across, along with the options (and emojis) that belong to it"""
+    def __init__(self, index:int):
+        self.index = index
+        self.msg = None
+        self.content = None # what the message was last sent/edited with
+        self.options = [] # option indices, in the same order as their emojis
+
 class VoteInfo:
     """Class for running a vote with a given list of choices"""
-    def __init__(self):
+    # The regional indicator emojis from A to Z, shared by every vote
+    ALPHA_EMOJI = tuple(chr(127462 + i) for i in range(26))
+    
+    def __init__(self, render_interval:float=1.5, metrics:Optional[GuildMetrics]=None, reaction_spacing:float=0.25, event_log:Optional[VoteEventLog]=None, title:str="Movie Vote", tally:Optional[VoteTally]=None, on_lost:Optional[Callable[[], Awaitable[None]]]=None):
+        self.title = title
         self.vote_bar_filled = '█'
         self.vote_bar_empty = '░'
         self.fuzzy_match_ratio = 0.5
         
         self._enabled = False
-        self._msg = None
         self._choices = []
-        self._movie_votes = {}
-        self._user_votes  = {}
+        self._options = []  # option index -> entry, the index is the option's position in the choices
+        self._tally = tally if tally is not None else VoteTally()   # in memory, unless a shared store's tally is given
+        self._ranking = VoteRanking()
+        
+        # Discord only allows 20 different reactions on a message, so larger votes are split across several messages
+        self.shard_size = 20
+        self.max_message_length = 2000
+        self._shards = []
+        self._shard_msgs = {}   # message id -> shard
+        self._routes = {}       # option index -> (shard, emoji offset)
+        self._dirty_shards = set()
+        self._rendered_max = 0
+        self._row_cache = {}    # option index -> (votes, max votes, max title length, rendered row)
         
         self.pin_vote = False
+        self.metrics = metrics if metrics is not None else GuildMetrics()
+        
+        # Max number of reactions whose users are fetched at once when restoring a vote
+        self.restore_concurrency = 4
+        
+        # Reactions only mark the vote message as stale, the scheduler batches them into a single edit
+        self._render_scheduler = RenderScheduler(self._render_scheduled, render_interval)
+        
+        # The bot's own reactions are added in the background, so the vote can be used as soon as it's posted
+        self._seeder = ReactionSeeder(reaction_spacing)
+        
+        # Every change to the vote is logged locally, so it can be rebuilt after a restart without reading the reactions back
+        self.event_log = event_log
+        self._replaying = False
+        if self.event_log is not None:
+            self.event_log.set_snapshot_source(self._snapshot_events)
+        
+        # Missed reaction events are caught by comparing the reaction counts every so often, more often the busier the vote is
+        self.reconcile_min_interval = 60.0
+        self.reconcile_max_interval = 1800.0
+        self.reconcile_activity_scale = 20
+        self._events_since_reconcile = 0
+        self._last_reconcile = time.monotonic()
+        self._touched_options = set()   # options voted on while their users are being paged through
+        
+        # Called once a vote has been ended because its message was deleted, so the saved vote can be cleared
+        self._on_lost = on_lost
         
-        self.alpha_emoji = [VoteInfo.gen_alpha_emoji(i) for i in range(26)]
+        # Votes read back from the reactions have lost the order each user clicked in, which the ranked tally modes rely on
+        self._ranks_degraded = False
+    
     
     async def start_vote(self, choices:List[str], ctx:discord.ext.commands.Context) -> int:
         """Starts a new vote and posts a new vote message to the chat in the given context"""
@@ -38,24 +106,26 @@ class VoteInfo:
         
         self._choices = choices
         self._create_vote_structures()
+        self._log_event({"op": "start", "choices": list(choices)})
         
         await self.update_vote_message(ctx)
         
         if self.pin_vote:
             try:
-                await self._msg.pin()
+                await self._shards[0].msg.pin()
             except (discord.Forbidden, discord.NotFound):
                 pass
             except discord.HTTPException:
-                # TODO: Log this
+                self.metrics.incr("http_errors")
+                log.warning("Failed to pin the vote message", exc_info=True)
                 raise VoteException("Unknown error occurred when pinning vote!")
         
-        for i in range(len(self._choices)):
-            await self._msg.add_reaction(self.alpha_emoji[i])
+        for shard in self._shards:
+            self._seeder.seed(shard.msg, self.ALPHA_EMOJI[:len(shard.options)])
         
-        return self._msg.id
+        return self._shards[0].msg.id
     
-    async def stop_vote(self, ctx:discord.ext.commands.Context) -> Tuple[str, Optional[List[str]]]:
+    async def stop_vote(self, ctx:discord.ext.commands.Context, tally_mode:str="plurality", show_removals:bool=True) -> Tuple[str, Optional[List[str]]]:
         """
         Stops a vote, 
         updates the vote message with the final results,
@@ -65,36 +135,53 @@ class VoteInfo:
         if not self._enabled:
             raise VoteException("Voting hasn't started!")
         
+        if tally_mode not in TALLY_MODES:
+            raise VoteException(f"Unknown tally mode: {tally_mode}")
+        
         self._enabled = False
+        self._log_vote_end("stop")
         
-        sorted_movie_list = self._sorted_movie_votes()
-        num_votes = len(sorted_movie_list[0]['votes'])
-        winner = sorted_movie_list[0]
+        leaders, num_votes = self._tally_winners(tally_mode)
+        tie_list = [self._options[option] for option in leaders]
+        winner = tie_list[0]
         tie_text = ""
         
         # Check if there is a tie and handle this with a random selection
-        if len(sorted_movie_list) > 1 and len(sorted_movie_list[1]['votes']) == num_votes:
-            tie_list = [movie for movie in sorted_movie_list if len(movie['votes']) == num_votes]
+        if len(tie_list) > 1:
             winner = random.choice(tie_list)
-            
-            tie_text = "**, **".join([movie['title'] for movie in tie_list[:-1]])
-            tie_text = F"**{tie_text}**, and **{tie_list[-1]['title']}** were tied."
+        
+        winner_text = F"@everyone The winner of the vote, with {num_votes}, is: **{winner['title']}**."
+        
+        # The tie and removal lists share what's left of the message
+        list_length = (self.max_message_length - len(winner_text)) // 2 - 100
+        
+        if len(tie_list) > 1:
+            tie_text = F"{self._join_titles([movie['title'] for movie in tie_list], list_length)} were tied."
+        
+        if tally_mode != "plurality" and self._ranks_degraded:
+            self.metrics.incr("degraded_ranked_tallies")
+            tie_text += "\nSome votes had to be read back from the reactions, which loses the order they were made in, so those users' preferences were ranked by option instead."
         
         # Get a list of movies to remove
-        bad_votes = [movie['title'] for movie in sorted_movie_list if len(movie['votes']) <= 1]
+        bad_votes = [self._options[option]['title'] for option in self._ranking.at_most(1)]
         loss_text = ""
         
-        # Check if there are any movies to remove, and if so make some text listing them
+        # Check if there are any movies to remove, and if so make some text listing them (polls don't remove anything)
+        if not show_removals:
+            bad_votes = []
+        
         if len(bad_votes) > 1:
-            loss_text = "**, **".join(bad_votes[:-1])
-            loss_text = F"Movies with only one vote or less, to be removed: **{loss_text}**, and **{bad_votes[-1]}**."
+            loss_text = F"Movies with only one vote or less, to be removed: {self._join_titles(bad_votes, list_length)}."
         elif len(bad_votes) == 1:
             loss_text = F"Movie with only one vote or less, to be removed: **{bad_votes[0]}**."
         
+        # Make sure the vote message shows the final tally before moving on
+        await self._render_scheduler.flush()
+        
         await self._clear_msg()
         await self.update_vote_message(ctx, sort_list=True)
         await ctx.send(
-            F"@everyone The winner of the vote, with {num_votes}, is: **{winner['title']}**.\n{tie_text}\n\n{loss_text}",
+            F"{winner_text}\n{tie_text}\n\n{loss_text}",
             allowed_mentions=discord.AllowedMentions.all()
         )
         
@@ -106,55 +193,44 @@ class VoteInfo:
             raise VoteException("Voting hasn't started!")
         
         self._enabled = False
+        self._log_vote_end("cancel")
+        self._render_scheduler.reset()
         await self._clear_vote()
     
-    async def update_vote_message(self, ctx:discord.ext.commands.Context, sort_list:bool=False) -> None:
-        """Creates a new (or updates the current) vote message in a given context"""
-        sorted_votes = self._sorted_movie_votes()
-        max_votes = len(sorted_votes[0]['votes']) if len(sorted_votes) > 0 else 0
-        
-        title = "**Movie Vote:**\n"
-        border = "= = = = ="
-        msg = []
-        
-        entry_list = sorted_votes if sort_list else self._movie_votes.values()
-        
-        for entry in entry_list:
-            num_votes = len(entry['votes'])
-            
-            frac_vote = float(num_votes) / float(max_votes) if max_votes > 0 else 0
-            frac_vote = int(frac_vote * 20.0)
-            
-            bar_fill = self.vote_bar_filled * frac_vote
-            bar_empty = self.vote_bar_empty * (20 - frac_vote)
-            
-            entry_title = entry['title']
-            alpha = entry['alpha']
-            icon = f":regional_indicator_{alpha}:"
-            
-            msg.append(f"{bar_fill}{bar_empty}{icon} - **{entry_title}** ({num_votes})")
-        
-        content = title + border + "\n" + "\n".join(msg) + "\n" + border
-        
+    async def update_vote_message(self, ctx:discord.ext.commands.Context, sort_list:bool=False, shards:Optional[List[VoteShard]]=None) -> None:
         """
-        em = discord.Embed(
-            title=title,
-            description=content,
-            color=discord.Color.green()
-        )
+        Creates new (or updates the current) vote messages in a given context,
+        if a list of shards is given only their messages are updated
         """
+        max_votes = self._ranking.max_count()
+        
+        if sort_list:
+            # The sorted results are always posted as new messages, split up the same way as the vote
+            entry_list = self._sorted_movie_votes()
+            for i in range(0, len(entry_list), self.shard_size):
+                content = self._render_content(i // self.shard_size, entry_list[i:i + self.shard_size], max_votes)
+                await self._send_or_edit(None, ctx, content)
+            
+            return
         
-        try:
-            if self._msg is None and ctx is not None:
-                self._msg = await ctx.send(content=content)
+        if shards is None or len(shards) == len(self._shards):
+            self._rendered_max = max_votes
+        
+        for shard in (self._shards if shards is None else shards):
+            entry_list = [self._options[option] for option in shard.options]
+            content = self._render_content(shard.index, entry_list, max_votes)
+            
+            if shard.msg is None:
+                shard.msg = await self._send_or_edit(None, ctx, content)
+                self._shard_msgs[shard.msg.id] = shard
+            elif content == shard.content:
+                # Votes often don't change what's shown (eg. the bars round down to the same length), so don't send the same text again
+                self.metrics.incr("message_edits_unchanged")
+                continue
             else:
-                await self._msg.edit(content=content)
-        except discord.Forbidden:
-            # TODO: message the user?
-            raise VoteException("Unable to send message in the given context.")
-        except discord.HTTPException:
-            # TODO: log this
-            raise VoteException("Unknown error occurred!")
+                await self._send_or_edit(shard.msg, ctx, content)
+            
+            shard.content = content
     
     async def add_voting_option(self, movie_title:str) -> None:
         """Add a new voting option to the vote, while vote is happening"""
@@ -165,12 +241,14 @@ class VoteInfo:
         
         # Create an entry in the voting structures
         self._add_vote_structure(movie_title, index)
+        self._log_event({"op": "option", "title": movie_title})
+        shard, offset = self._routes[index]
         
-        # Update the voting message
-        await self.update_vote_message(None)
+        # Update the voting message, if the last message was full the option gets a new message of its own
+        await self.update_vote_message(self._shards[0].msg.channel, shards=[shard])
         
-        # Add a react to the message
-        await self._msg.add_reaction(self.alpha_emoji[index])
+        # Add a react to the message, after any that are still being added
+        self._seeder.seed(shard.msg, [self.ALPHA_EMOJI[offset]])
         
     def is_voting_enabled(self) -> bool:
         return self._enabled
@@ -179,30 +257,159 @@ class VoteInfo:
         if not self._enabled:
             return
         
+        shard = self._shard_msgs.get(raw_reaction.message_id)
         offset = VoteInfo.get_alpha_offset_from_emoji(raw_reaction.emoji)
-        if offset == -1 or offset >= len(self._choices):
+        if shard is None or offset == -1 or offset >= len(shard.options):
             return
         
-        self._apply_vote(self._choices[offset], raw_reaction.user_id)
-        
-        # TODO: Apply a timer or something for larger servers (same for reaction adding/removing)
-        await self.update_vote_message(None)
+        self._apply_vote(shard.options[offset], raw_reaction.user_id)
+        self._touched_options.add(shard.options[offset])
+        self._events_since_reconcile += 1
+        self._request_render(shard)
         
     async def reaction_remove_listener(self, raw_reaction:discord.RawReactionActionEvent) -> None:
         if not self._enabled:
             return
         
+        shard = self._shard_msgs.get(raw_reaction.message_id)
         offset = VoteInfo.get_alpha_offset_from_emoji(raw_reaction.emoji)
-        if offset == -1 or offset >= len(self._choices):
+        if shard is None or offset == -1 or offset >= len(shard.options):
+            return
+        
+        self._remove_vote(shard.options[offset], raw_reaction.user_id)
+        self._touched_options.add(shard.options[offset])
+        self._events_since_reconcile += 1
+        self._request_render(shard)
+    
+    async def reaction_clear_listener(self, raw_clear:discord.RawReactionClearEvent) -> None:
+        """Drops every vote on a message whose reactions were all cleared, and puts the bot's reactions back"""
+        if not self._enabled:
             return
         
-        self._remove_vote(self._choices[offset], raw_reaction.user_id)
+        shard = self._shard_msgs.get(raw_clear.message_id)
+        if shard is None:
+            return
+        
+        for option in shard.options:
+            self._clear_option_votes(option)
+        
+        self._events_since_reconcile += 1
+        self._request_render(shard)
+        self._seeder.seed(shard.msg, self.ALPHA_EMOJI[:len(shard.options)])
+    
+    async def reaction_clear_emoji_listener(self, raw_clear:discord.RawReactionClearEmojiEvent) -> None:
+        """Drops every vote for an option whose reaction was cleared, and puts the bot's reaction back"""
+        if not self._enabled:
+            return
+        
+        shard = self._shard_msgs.get(raw_clear.message_id)
+        offset = VoteInfo.get_alpha_offset_from_emoji(raw_clear.emoji)
+        if shard is None or offset == -1 or offset >= len(shard.options):
+            return
+        
+        self._clear_option_votes(shard.options[offset])
+        self._events_since_reconcile += 1
+        self._request_render(shard)
+        self._seeder.seed(shard.msg, [self.ALPHA_EMOJI[offset]])
+    
+    def is_reconcile_due(self) -> bool:
+        """Whether it's time to check the tally against the reactions, busy votes are checked more often than quiet ones"""
+        interval = self.reconcile_max_interval / (1 + self._events_since_reconcile / self.reconcile_activity_scale)
+        interval = max(self.reconcile_min_interval, interval)
+        return time.monotonic() - self._last_reconcile >= interval
+    
+    async def reconcile(self, bot_id:int) -> int:
+        """
+        Corrects the tally from the reactions on the vote messages, only the users of options
+        whose reaction count doesn't match the tally are paged through, returns the number of options corrected
+        """
+        self._events_since_reconcile = 0
+        self._last_reconcile = time.monotonic()
+        corrected = 0
+        
+        for shard in list(self._shards):
+            if shard.msg is None:
+                continue
+            
+            try:
+                msg = await shard.msg.channel.fetch_message(shard.msg.id)
+            except discord.NotFound:
+                await self._end_lost_vote()
+                return corrected
+            except (discord.Forbidden, discord.HTTPException):
+                self.metrics.incr("reconcile_fetch_errors")
+                continue
+            
+            # Counts don't include the bot's own reaction
+            reactions = {}
+            counts = {}
+            for react in msg.reactions:
+                offset = VoteInfo.get_alpha_offset_from_emoji(react.emoji)
+                if offset == -1 or offset >= len(shard.options):
+                    continue
+                
+                reactions[shard.options[offset]] = react
+                counts[shard.options[offset]] = react.count - (1 if react.me else 0)
+            
+            for option in list(shard.options):
+                if not self._enabled or shard.msg is None:
+                    # The vote ended while we were waiting on Discord
+                    return corrected
+                
+                if counts.get(option, 0) == self._tally.count(option):
+                    continue
+                
+                self._touched_options.discard(option)
+                user_ids = set()
+                if option in reactions:
+                    user_ids = {user.id async for user in reactions[option].users() if user.id != bot_id}
+                
+                if not self._enabled or shard.msg is None:
+                    return corrected
+                
+                # Votes that came in while paging would look wrong against the older user list, leave them to the next check
+                if option in self._touched_options:
+                    continue
+                
+                voters = set(self._tally.voters(option))
+                missed = list(user_ids - voters)
+                if len(missed) > 0:
+                    self._apply_votes(option, missed)
+                    self._degrade_ranks()
+                for uid in voters - user_ids:
+                    self._remove_vote(option, uid)
+                
+                corrected += 1
+                self._request_render(shard)
         
-        # TODO: Apply a timer or something for larger servers (same for reaction adding/removing)
-        await self.update_vote_message(None)
+        return corrected
     
     def check_msg_id(self, id:int) -> bool:
-        return self._msg is not None and id == self._msg.id
+        return id in self._shard_msgs
+    
+    def get_msg_ids(self) -> List[int]:
+        """Returns the ids of all the vote messages, in order"""
+        return [shard.msg.id for shard in self._shards if shard.msg is not None]
+    
+    def get_render_stats(self) -> Dict[str, int]:
+        """Returns the number of vote message edits sent, and the number skipped by coalescing reactions"""
+        return self._render_scheduler.stats()
+    
+    def get_memory_footprint(self) -> int:
+        """Rough size of the vote's state in bytes"""
+        size = self._tally.memory_footprint()
+        size += sys.getsizeof(self._options) + sum(sys.getsizeof(entry) for entry in self._options)
+        size += sys.getsizeof(self._choices) + sys.getsizeof(self._routes) + sys.getsizeof(self._shard_msgs)
+        size += sum(sys.getsizeof(cached[-1]) for cached in self._row_cache.values()) + sys.getsizeof(self._row_cache)
+        return size
+    
+    def get_seed_stats(self) -> Dict[str, int]:
+        """Returns the number of the bot's reactions added, retried, given up on and still waiting to be added"""
+        return self._seeder.stats()
+    
+    async def wait_until_seeded(self) -> None:
+        """Waits until all of the bot's reactions have been added to the vote messages"""
+        await self._seeder.wait()
     
     """ Private methods """
     
@@ -212,69 +419,382 @@ class VoteInfo:
             key = self._choices[i] # title
             self._add_vote_structure(key, i)
     
+    def _rebuild_ranking(self) -> None:
+        self._ranking.clear()
+        for option in range(self._tally.num_options()):
+            self._ranking.add_option(option)
+            self._ranking.increment(option, self._tally.count(option))
+    
     def _add_vote_structure(self, key, index) -> None:
+        # Route the option to its message, starting a new one when the last is full
+        shard_index, offset = divmod(index, self.shard_size)
+        if shard_index >= len(self._shards):
+            self._shards.append(VoteShard(shard_index))
+        
+        shard = self._shards[shard_index]
+        shard.options.append(index)
+        self._routes[index] = (shard, offset)
+        
         entry = {
             "title": key, # title
-            "alpha": alphabet[index], # alphabetical indicator
-            "votes": set() # set of user ids
+            "alpha": alphabet[offset], # alphabetical indicator
+            "index": index # option index, the votes themselves are kept in the tally
         }
         
-        self._movie_votes[key] = entry
+        self._options.append(entry)
+        self._tally.add_option()
+        self._ranking.add_option(index)
     
-    async def _set_prev_vote_msg(self, prev_vote_msg:discord.Message, suggestions:List[str], bot_id:int) -> None:
-        if prev_vote_msg is not None:
+    async def _set_prev_vote_msgs(self, prev_vote_msgs:List[Optional[discord.Message]], suggestions:List[str], bot_id:int) -> None:
+        if len(prev_vote_msgs) > 0 and prev_vote_msgs[0] is not None:
             # If there is a previous vote (ie. the bot shutdown, or crashed)
-            # get the votes that are currently on the message
-            
-            # Set the current message
-            self._msg = prev_vote_msg
+            # get the votes that are currently on the messages
             
-            # Create vote structures with the given choices
+            # Create vote structures with the given choices, starting from the reactions alone
+            # (which drops anything a shared store still has for this vote)
+            self._tally.clear()
             self._choices = suggestions
             self._create_vote_structures()
             
+            # Set the current messages, any that couldn't be found are left out of the vote
+            for shard, msg in zip(self._shards, prev_vote_msgs):
+                shard.msg = msg
+                if msg is not None:
+                    self._shard_msgs[msg.id] = shard
+            
             # Get the reactions (votes)
-            for react in prev_vote_msg.reactions:
-                async for user in react.users():
+            reactions = []
+            for shard in self._shards:
+                if shard.msg is None:
+                    continue
+                
+                for react in shard.msg.reactions:
                     offset = VoteInfo.get_alpha_offset_from_emoji(react.emoji)
-                    if offset == -1 or offset >= len(self._choices):
+                    if offset == -1 or offset >= len(shard.options):
                         # If the reaction is an invalid choice, skip
                         continue
                     
-                    if user.id != bot_id:
-                        # Only if the user ID is NOT the bot ID do we use it
-                        self._apply_vote(self._choices[offset], user.id)
+                    if react.count <= (1 if react.me else 0):
+                        # Nobody but the bot has reacted, so there's nothing to fetch
+                        continue
+                    
+                    reactions.append((shard.options[offset], react))
+            
+            # Fetch the users of several reactions at once, each one pages through its own users
+            semaphore = asyncio.Semaphore(self.restore_concurrency)
+            
+            async def fetch_user_ids(react:discord.Reaction) -> List[int]:
+                async with semaphore:
+                    return [user.id async for user in react.users()]
+            
+            reaction_users = await asyncio.gather(*[fetch_user_ids(react) for _, react in reactions])
+            
+            for (option, _), user_ids in zip(reactions, reaction_users):
+                # Only if the user ID is NOT the bot ID do we use it
+                self._apply_votes(option, [uid for uid in user_ids if uid != bot_id])
+            
+            self._degrade_ranks()
             
             # Set voting enabled
             self._enabled = True
             
-            # Update the message
-            await self.update_vote_message(None)
+            # Update the messages, without holding up the restore
+            self._dirty_shards.update(range(len(self._shards)))
+            self._render_scheduler.request()
+    
+    async def _restore_from_log(self, events:List[Dict], vote_msgs:List[discord.abc.Snowflake]) -> bool:
+        """
+        Rebuilds a vote by replaying its logged events, without reading anything from Discord,
+        returns False if the log doesn't hold an on-going vote split across the given messages
+        """
+        # The tally's backing store (if any) already has the votes being replayed
+        self._replaying = True
+        self._tally.set_recording(False)
+        try:
+            for event in events:
+                await self._replay_event(event)
+        except Exception:
+            # A log that doesn't make sense is no use, the vote is read back from the reactions instead
+            log.warning("Failed to replay the vote event log", exc_info=True)
+            return False
+        finally:
+            self._replaying = False
+            self._tally.set_recording(True)
+        
+        if not self._enabled or len(self._shards) != len(vote_msgs):
+            return False
+        
+        for shard, msg in zip(self._shards, vote_msgs):
+            shard.msg = msg
+            self._shard_msgs[msg.id] = shard
+        
+        # A shared store can be ahead of the log (ie. votes taken by another process), so its votes win
+        if await self._tally.load():
+            self._rebuild_ranking()
+        
+        # The message contents aren't known, so redraw them all
+        self._dirty_shards.update(range(len(self._shards)))
+        self._render_scheduler.request()
+        return True
+    
+    async def _replay_event(self, event:Dict) -> None:
+        op = event["op"]
+        
+        # Votes for options the log never created mean events are missing
+        options = [event["option"]] if "option" in event else [option for option, _ in event.get("votes", [])]
+        for option in options:
+            if not isinstance(option, int) or not 0 <= option < len(self._options):
+                raise ValueError(f"Logged {op} event is for an unknown option: {option}")
+        
+        if op == "start":
+            await self._clear_vote()
+            self._choices = list(event["choices"])
+            self._create_vote_structures()
+            self._enabled = True
+        elif op == "option":
+            index = len(self._choices)
+            self._choices.append(event["title"])
+            self._add_vote_structure(event["title"], index)
+        elif op == "add":
+            self._apply_vote(event["option"], event["user"])
+        elif op == "add_many":
+            self._apply_votes(event["option"], event["users"])
+        elif op == "remove":
+            self._remove_vote(event["option"], event["user"])
+        elif op == "clear":
+            self._clear_option_votes(event["option"])
+        elif op == "votes":
+            for option, uid in event["votes"]:
+                self._apply_vote(option, uid)
+        elif op == "ranks_degraded":
+            self._ranks_degraded = True
+        elif op in ("stop", "cancel"):
+            self._enabled = False
+            await self._clear_vote()
+        else:
+            raise ValueError(f"Unknown logged event: {op}")
+    
+    def _snapshot_events(self) -> List[Dict]:
+        # The shortest list of events that rebuilds the vote as it is now, votes are kept in the order they arrived
+        if not self._enabled:
+            return []
+        
+        events = [
+            {"op": "start", "choices": list(self._choices)},
+            {"op": "votes", "votes": self._tally.votes_in_order()}
+        ]
+        
+        if self._ranks_degraded:
+            events.append({"op": "ranks_degraded"})
+        
+        return events
+    
+    def _degrade_ranks(self) -> None:
+        if not self._ranks_degraded:
+            self._ranks_degraded = True
+            self._log_event({"op": "ranks_degraded"})
+    
+    def _log_event(self, event:Dict) -> None:
+        if self.event_log is not None and not self._replaying:
+            self.event_log.append(event)
+    
+    def _log_vote_end(self, op:str) -> None:
+        if self.event_log is None:
+            return
+        
+        # Nothing is left to restore once the vote is over, so write an empty snapshot straight away
+        self._log_event({"op": op})
+        asyncio.ensure_future(self.event_log.compact())
+    
+    def _request_render(self, shard:VoteShard) -> None:
+        self._dirty_shards.add(shard.index)
+        self._render_scheduler.request()
+    
+    async def _render_scheduled(self) -> None:
+        if len(self._shards) == 0:
+            return
+        
+        if self._ranking.max_count() != self._rendered_max:
+            # The vote bars are relative to the top option, so they all need to be redrawn
+            shards = self._shards
+        else:
+            shards = [shard for shard in self._shards if shard.index in self._dirty_shards]
+        
+        shards = [shard for shard in shards if shard.msg is not None]
+        self._dirty_shards = set()
+        
+        try:
+            await self.update_vote_message(None, shards=shards)
+        except VoteMessageLost:
+            # The vote is being ended, there's nothing left to draw
+            return
+        except BaseException:
+            # Try these again on the next render
+            self._dirty_shards.update(shard.index for shard in shards)
+            raise
+    
+    def _render_content(self, shard_index:int, entry_list:List[Dict], max_votes:int) -> str:
+        title = f"**{self.title}:**\n" if shard_index == 0 else f"**{self.title} (part {shard_index + 1}):**\n"
+        border = "= = = = ="
+        msg = []
+        
+        for entry in entry_list:
+            msg.append(self._render_row(entry, max_votes))
+        
+        content = title + border + "\n" + "\n".join(msg) + "\n" + border
+        
+        if len(content) > self.max_message_length:
+            # Titles have no length limit, so cut them down evenly until the ballot fits in one message
+            overflow = len(content) - self.max_message_length
+            title_chars = sum(len(entry['title']) for entry in entry_list)
+            max_title_length = max(1, (title_chars - overflow) // len(entry_list))
+            
+            msg = [self._render_row(entry, max_votes, max_title_length) for entry in entry_list]
+            content = title + border + "\n" + "\n".join(msg) + "\n" + border
+        
+        """
+        em = discord.Embed(
+            title=title,
+            description=content,
+            color=discord.Color.green()
+        )
+        """
+        
+        return content
+    
+    def _join_titles(self, titles:List[str], max_length:int) -> str:
+        """Lists the titles as "**a**, **b**, and **c**", leaving the last ones off (as "N more") past max_length"""
+        shown = len(titles)
+        while True:
+            names = [f"**{title}**" for title in titles[:shown]]
+            if shown < len(titles):
+                names.append(f"{len(titles) - shown} more")
+            
+            text = names[0] if len(names) == 1 else ", ".join(names[:-1]) + ", and " + names[-1]
+            if len(text) <= max_length or shown == 0:
+                return text
+            
+            shown -= 1
+    
+    def _render_row(self, entry:Dict, max_votes:int, max_title_length:Optional[int]=None) -> str:
+        # Rows only change when their votes (or the top option's votes) do, so most are reused from the last render
+        num_votes = self._tally.count(entry['index'])
+        cached = self._row_cache.get(entry['index'])
+        if cached is not None and cached[:3] == (num_votes, max_votes, max_title_length):
+            return cached[3]
+        
+        frac_vote = float(num_votes) / float(max_votes) if max_votes > 0 else 0
+        frac_vote = int(frac_vote * 20.0)
+        
+        bar_fill = self.vote_bar_filled * frac_vote
+        bar_empty = self.vote_bar_empty * (20 - frac_vote)
+        
+        entry_title = entry['title']
+        if max_title_length is not None and len(entry_title) > max_title_length:
+            entry_title = entry_title[:max_title_length - 1] + "…"
+        
+        alpha = entry['alpha']
+        icon = f":regional_indicator_{alpha}:"
+        
+        row = f"{bar_fill}{bar_empty}{icon} - **{entry_title}** ({num_votes})"
+        self._row_cache[entry['index']] = (num_votes, max_votes, max_title_length, row)
+        return row
+    
+    async def _send_or_edit(self, msg:Optional[discord.Message], ctx:discord.abc.Messageable, content:str) -> discord.Message:
+        try:
+            if msg is None and ctx is not None:
+                with self.metrics.time("message_send"):
+                    msg = await ctx.send(content=content)
+                
+                self.metrics.incr("message_sends")
+            else:
+                with self.metrics.time("message_edit"):
+                    await msg.edit(content=content)
+                
+                self.metrics.incr("message_edits")
+            
+            return msg
+        except discord.Forbidden:
+            # TODO: message the user?
+            self.metrics.incr("forbidden_errors")
+            raise VoteException("Unable to send message in the given context.")
+        except discord.NotFound:
+            if msg is None or msg.id not in self._shard_msgs:
+                raise VoteException("Unable to send message in the given context.")
+            
+            # Not waited on, since ending the vote cancels the render that may be calling this
+            asyncio.ensure_future(self._end_lost_vote())
+            raise VoteMessageLost("The vote message has been deleted!")
+        except discord.HTTPException:
+            self.metrics.incr("http_errors")
+            log.warning("Failed to update the vote message", exc_info=True)
+            raise VoteException("Unknown error occurred!")
+    
+    async def _end_lost_vote(self) -> None:
+        # A vote whose message is gone can't take votes or show them
+        if not self._enabled:
+            return
+        
+        log.warning("A %s message was deleted, ending the vote", self.title)
+        self.metrics.incr("lost_votes")
+        self._enabled = False
+        self._log_vote_end("cancel")
+        await self._clear_vote()
+        
+        if self._on_lost is not None:
+            await self._on_lost()
     
     async def _clear_vote(self) -> None:
+        self._render_scheduler.reset()
         await self._clear_msg()
         
         self._choices = []
-        self._movie_votes = {}
-        self._user_votes = {}
+        self._options = []
+        self._tally.clear()
+        self._ranking.clear()
+        self._shards = []
+        self._routes = {}
+        self._dirty_shards = set()
+        self._rendered_max = 0
+        self._row_cache = {}
+        self._ranks_degraded = False
         self._result = ""
     
     async def _clear_msg(self) -> None:
-        if self._msg is not None:
+        # Don't keep reacting to messages that are no longer the vote
+        self._seeder.cancel()
+        
+        if len(self._shards) > 0 and self._shards[0].msg is not None:
             if self.pin_vote:
                 try:
-                    await self._msg.unpin()
+                    await self._shards[0].msg.unpin()
                 except (discord.Forbidden, discord.NotFound):
                     pass
                 except discord.HTTPException:
-                    # TODO: Log this
+                    self.metrics.incr("http_errors")
+                    log.warning("Failed to unpin the vote message", exc_info=True)
                     self._enabled = False
                     raise VoteException("Unknown error occurred!")
-                
-            self._msg = None
+        
+        for shard in self._shards:
+            shard.msg = None
+            shard.content = None
+        
+        self._shard_msgs = {}
+    
+    def _tally_winners(self, tally_mode:str) -> Tuple[List[int], str]:
+        """Returns the options tied for the win under the tally mode, and the text for their score"""
+        if tally_mode == "instant_runoff":
+            leaders, score = instant_runoff(ballot_matrix(self._tally))
+            return leaders, f"{score} in the final round"
+        elif tally_mode == "borda":
+            leaders, points = borda(ballot_matrix(self._tally))
+            return leaders, f"{points} points"
+        
+        return self._ranking.leaders(), str(self._ranking.max_count())
     
     def _sorted_movie_votes(self) -> List[Dict]:
-        return sorted(self._movie_votes.values(), key=cmp_to_key(lambda x, y: len(y['votes']) - len(x['votes'])))
+        return [self._options[option] for option in self._ranking.ranked()]
     
     def _get_movie_from_alpha(self, alpha:str) -> str:
         if alpha not in alphaset:
@@ -286,34 +806,46 @@ class VoteInfo:
         
         return self._choices[index]
     
-    def _apply_vote(self, title:str, uid:str) -> None:
-        # Make the user vote set, if it doesn't exist already
-        if uid not in self._user_votes:
-            self._user_votes[uid] = set()
-        
-        self._user_votes[uid].add(title)
-        self._movie_votes[title]['votes'].add(uid)
+    def _apply_vote(self, option:int, uid:int) -> None:
+        # Duplicate votes shouldn't count twice in the ranking
+        if self._tally.add(option, uid):
+            self._ranking.increment(option)
+            self._log_event({"op": "add", "option": option, "user": uid})
     
-    def _remove_vote(self, title:str, uid:str) -> None:
-        try:
-            self._user_votes[uid].remove(title)
-            self._movie_votes[title]['votes'].remove(uid)
-        except KeyError:
+    def _apply_votes(self, option:int, uids:List[int]) -> None:
+        """Applies the votes of several users for the same option at once"""
+        added = self._tally.add_many(option, uids)
+        if added > 0:
+            self._ranking.increment(option, added)
+            self._log_event({"op": "add_many", "option": option, "users": list(uids)})
+    
+    def _remove_vote(self, option:int, uid:int) -> None:
+        if not self._tally.remove(option, uid):
             """
             Niche error case where the first time a vote structure is created is on a remove of the *last* reaction from a user (eg. not including the bot's reaction)
             
-            So: A bot has started and there is a pre-existing vote in progress, but the _set_prev_vote_msg() function has not run.
+            So: A bot has started and there is a pre-existing vote in progress, but the _set_prev_vote_msgs() function has not run.
             Therefore there is no filled VoteInfo() structure. 
             
             There is a movie "test" with only 2 reactions, the bot and a user "Alyx". Alyx removes their vote, and this triggers the first call to get_vote_info() 
-            since the bot has started. It goes to _set_prev_vote_msg() and since the reaction doesn't exist, never calls _apply_vote() for Alyx with the "test" movie.
+            since the bot has started. It goes to _set_prev_vote_msgs() and since the reaction doesn't exist, never calls _apply_vote() for Alyx with the "test" movie.
             
-            Finally we arrive at _remove_vote() with which we are calling self._user_votes[uid].remove(title), and the title "test" does not exist in that structure.
+            Finally we arrive at _remove_vote() with which we are calling self._tally.remove(option, uid), and there is no vote for "test" from Alyx to remove.
             
-            Similar issue for self._movie_votes[title]['votes'].remove(uid)
+            Anything like this that leaves the tally out of step with the reactions is fixed by reconcile().
             """
-            # TODO: Better way to do this
-            pass
+            return
+        
+        self._ranking.decrement(option)
+        self._log_event({"op": "remove", "option": option, "user": uid})
+    
+    def _clear_option_votes(self, option:int) -> None:
+        # A cleared reaction is one event, not one per voter
+        removed = self._tally.clear_option(option)
+        self._touched_options.add(option)
+        if removed > 0:
+            self._ranking.decrement(option, removed)
+            self._log_event({"op": "clear", "option": option})
         
     
     @staticmethod
@@ -330,12 +862,13 @@ class VoteInfo:
         return final.decode('utf-16')
         
     @staticmethod
-    def get_alpha_offset_from_emoji(emoji:discord.Emoji) -> int:
-        if (isinstance(emoji, discord.PartialEmoji)):
-            offset = ord(emoji.name) - 127462
-        else:
-            offset = ord(emoji) - 127462
+    def get_alpha_offset_from_emoji(emoji:Union[discord.Emoji, discord.PartialEmoji, str]) -> int:
+        # Custom emoji (and anything that isn't a single character, eg. flags or skin tones) are never a vote
+        name = emoji if isinstance(emoji, str) else getattr(emoji, "name", None)
+        if getattr(emoji, "id", None) is not None or not isinstance(name, str) or len(name) != 1:
+            return -1
         
+        offset = ord(name) - 127462
         if offset < 0 or offset >= 26:
             return -1
         
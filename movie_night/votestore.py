@@ -0,0 +1,238 @@
+import asyncio
+import itertools
+import logging
+import sqlite3
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .buffered import BufferedWriter
+from .tally import VoteTally
+
+log = logging.getLogger("red.mogs.movie_night")
+
+# Where vote tallies can be kept
+# memory: in this process only, rebuilt from the event log (or the reactions) after a restart
+# sqlite: in a SQLite database that every bot process using the same data directory shares
+VOTE_STORES = ("memory", "sqlite")
+
+class VoteStore:
+    """Hands out the tally each vote keeps its state in, the default keeps every tally in memory"""
+    name = "memory"
+    
+    def tally(self, vote:str) -> VoteTally:
+        """Returns a new tally for the named vote (eg. the guild id, or the guild id and poll name)"""
+        return VoteTally()
+    
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+    
+    def close(self) -> None:
+        """Called as the cog unloads, anything the store still has buffered is written out before it lets go"""
+        pass
+
+class SqliteVoteStore(VoteStore, BufferedWriter):
+    """
+    Keeps the tallies in a SQLite database in WAL mode, so several local processes can share them,
+    votes are buffered and written in batches, each in a single transaction
+    """
+    name = "sqlite"
+    
+    _schema = """
+    CREATE TABLE IF NOT EXISTS votes (
+        vote TEXT NOT NULL,
+        option INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        stamp INTEGER NOT NULL,
+        PRIMARY KEY (vote, option, user_id)
+    ) WITHOUT ROWID;
+    
+    -- Per-option counts kept by triggers in earlier versions, nothing reads them
+    DROP TRIGGER IF EXISTS votes_added;
+    DROP TRIGGER IF EXISTS votes_removed;
+    DROP TABLE IF EXISTS counts;
+    """
+    
+    # Repeated votes are ignored, so a vote keeps the stamp it first arrived with
+    _statements = {
+        "add": "INSERT OR IGNORE INTO votes (vote, option, user_id, stamp) VALUES (?, ?, ?, ?)",
+        "remove": "DELETE FROM votes WHERE vote = ? AND option = ? AND user_id = ?",
+        "clear_option": "DELETE FROM votes WHERE vote = ? AND option = ?",
+        "clear": "DELETE FROM votes WHERE vote = ?"
+    }
+    
+    def __init__(self, path:Path, flush_interval:float=0.5, busy_timeout:float=10.0):
+        super().__init__(flush_interval, f"the vote database {path}")
+        self.path = path
+        self.busy_timeout = busy_timeout
+        
+        self.batches_written = 0
+        self.changes_written = 0
+        
+        self._conn = None
+        
+        # The connection is only ever used from this one thread, which also keeps the batches in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="movie_night_votes")
+    
+    def tally(self, vote:str) -> VoteTally:
+        return SqliteVoteTally(self, vote)
+    
+    def record(self, statement:str, params:Tuple) -> None:
+        """Buffers a change, it's written to the database shortly after"""
+        self._buffer((statement, params))
+    
+    async def flush(self) -> None:
+        """Writes out the buffered changes as a single transaction"""
+        async with self._lock:
+            if len(self._pending) == 0:
+                return
+            
+            changes, self._pending = self._pending, []
+            await asyncio.get_event_loop().run_in_executor(self._executor, self._write, changes)
+    
+    async def load(self, vote:str) -> List[Tuple[int, int, int]]:
+        """Returns the named vote's (option, user id, stamp) rows, in the order they arrived"""
+        await self.flush()
+        return await asyncio.get_event_loop().run_in_executor(self._executor, self._read, vote)
+    
+    def stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "batches_written": self.batches_written,
+            "changes_written": self.changes_written,
+            "changes_pending": len(self._pending)
+        }
+    
+    def close(self) -> None:
+        try:
+            # Queued behind any batch that's already being written
+            self.flush_now()
+            self._executor.submit(self._close).result()
+        except sqlite3.Error:
+            log.exception("Failed to write the vote database %s", self.path)
+        finally:
+            self._executor.shutdown(wait=False)
+    
+    """ Private methods """
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Transactions are started by hand, so a batch is only ever written in full
+            self._conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self._schema)
+        
+        return self._conn
+    
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def _write_now(self, changes:List[Tuple[str, Tuple]]) -> None:
+        self._executor.submit(self._write, changes).result()
+    
+    def _write(self, changes:List[Tuple[str, Tuple]]) -> None:
+        if len(changes) == 0:
+            return
+        
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Runs of the same kind of change are sent together, the order between them is kept
+            for statement, run in itertools.groupby(changes, key=lambda change: change[0]):
+                conn.executemany(self._statements[statement], [params for _, params in run])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        
+        conn.execute("COMMIT")
+        self.batches_written += 1
+        self.changes_written += len(changes)
+    
+    def _read(self, vote:str) -> List[Tuple[int, int, int]]:
+        cursor = self._connect().execute("SELECT option, user_id, stamp FROM votes WHERE vote = ? ORDER BY stamp", (vote,))
+        return cursor.fetchall()
+
+class SqliteVoteTally(VoteTally):
+    """A VoteTally whose changes are written through to a SqliteVoteStore, reads are still served from memory"""
+    def __init__(self, store:SqliteVoteStore, vote:str):
+        super().__init__()
+        self._store = store
+        self._vote = vote
+        self._recording = True
+    
+    def add(self, option:int, uid:int) -> bool:
+        if not super().add(option, uid):
+            return False
+        
+        self._record("add", (self._vote, option, uid, self._clock))
+        return True
+    
+    def remove(self, option:int, uid:int) -> bool:
+        if not super().remove(option, uid):
+            return False
+        
+        self._record("remove", (self._vote, option, uid))
+        return True
+    
+    def clear_option(self, option:int) -> int:
+        removed = super().clear_option(option)
+        if removed > 0:
+            self._record("clear_option", (self._vote, option))
+        
+        return removed
+    
+    def clear(self) -> None:
+        super().clear()
+        self._record("clear", (self._vote,))
+    
+    def set_recording(self, recording:bool) -> None:
+        self._recording = recording
+    
+    async def load(self) -> bool:
+        rows = await self._store.load(self._vote)
+        if len(rows) == 0:
+            # Nothing stored for this vote yet (ie. the store was only just switched to), so it starts from ours
+            for option, uid in self.votes_in_order():
+                self._record("add", (self._vote, option, uid, self._stamp_of(option, uid)))
+            
+            return False
+        
+        num_options = self.num_options()
+        self._clear_votes()
+        
+        for option, uid, stamp in rows:
+            if option < num_options:
+                VoteTally.add(self, option, uid)
+            
+            # Later votes are stamped after the stored ones, so they keep their place in the ranked tallies
+            self._clock = max(self._clock, stamp)
+        
+        return True
+    
+    async def flush(self) -> None:
+        await self._store.flush()
+    
+    """ Private methods """
+    
+    def _record(self, statement:str, params:Tuple) -> None:
+        if self._recording:
+            self._store.record(statement, params)
+    
+    def _stamp_of(self, option:int, uid:int) -> int:
+        return self.stamps(option)[self._voter_slots[uid]]
+    
+    def _clear_votes(self) -> None:
+        # Drops the votes but keeps the options, without touching the store
+        for option in range(self.num_options()):
+            VoteTally.clear_option(self, option)
+        
+        self._voter_slots = {}
+        self._voter_ids = array('Q')
+        self._clock = 0
@@ -0,0 +1,22 @@
+import discord
+import pytest
+
+from movie_night.voteinfo import VoteInfo
+
+@pytest.mark.parametrize("offset", [0, 7, 25])
+def test_round_trip(offset):
+    emoji = VoteInfo.gen_alpha_emoji(offset)
+    assert VoteInfo.get_alpha_offset_from_emoji(emoji) == offset
+    assert VoteInfo.get_alpha_offset_from_emoji(discord.PartialEmoji(name=emoji)) == offset
+
+@pytest.mark.parametrize("emoji", [
+    discord.PartialEmoji(name="pepe", id=1),
+    discord.PartialEmoji(name=VoteInfo.gen_alpha_emoji(0), id=1),
+    discord.PartialEmoji(name=None, id=1),
+    "\U0001F1E8\U0001F1E6",
+    "\U0001F44D\U0001F3FD",
+    "\U0001F44D",
+    ""
+])
+def test_other_emoji_are_not_votes(emoji):
+    assert VoteInfo.get_alpha_offset_from_emoji(emoji) == -1
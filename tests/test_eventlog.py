@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from movie_night.eventlog import VoteEventLog
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+def appended(event_log, events):
+    async def append():
+        for event in events:
+            event_log.append(dict(event))
+        
+        await event_log.flush()
+    
+    run(append())
+
+def test_round_trip(tmp_path):
+    events = [{"op": "start", "choices": ["a", "b"]}, {"op": "add", "option": 1, "user": 10}]
+    appended(VoteEventLog(tmp_path, "1"), events)
+    
+    loaded = run(VoteEventLog(tmp_path, "1").load())
+    assert [{k: v for k, v in event.items() if k != "seq"} for event in loaded] == events
+    assert [event["seq"] for event in loaded] == [1, 2]
+
+def test_compaction_writes_snapshot_and_empties_log(tmp_path):
+    event_log = VoteEventLog(tmp_path, "1", compact_every=3)
+    snapshot = [{"op": "start", "choices": ["a"]}, {"op": "votes", "votes": [[0, 10], [0, 11]]}]
+    event_log.set_snapshot_source(lambda: snapshot)
+    appended(event_log, [{"op": "start", "choices": ["a"]}, {"op": "add", "option": 0, "user": 10}, {"op": "add", "option": 0, "user": 11}])
+    
+    with open(event_log.snapshot_path, encoding="utf-8") as f:
+        assert json.load(f) == {"seq": 3, "events": snapshot}
+    
+    assert event_log.log_path.read_text() == ""
+    assert run(VoteEventLog(tmp_path, "1").load()) == snapshot
+
+def test_torn_last_line_is_dropped(tmp_path):
+    event_log = VoteEventLog(tmp_path, "1")
+    appended(event_log, [{"op": "start", "choices": ["a"]}])
+    with open(event_log.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","opt')
+    
+    reopened = VoteEventLog(tmp_path, "1")
+    assert len(run(reopened.load())) == 1
+    
+    appended(reopened, [{"op": "add", "option": 0, "user": 10}])
+    assert [event["op"] for event in run(VoteEventLog(tmp_path, "1").load())] == ["start", "add"]
+
+def test_events_before_snapshot_are_skipped(tmp_path):
+    event_log = VoteEventLog(tmp_path, "1")
+    appended(event_log, [{"op": "start", "choices": ["a"]}, {"op": "add", "option": 0, "user": 10}])
+    
+    # The bot died after writing the snapshot, but before emptying the log
+    with open(event_log.snapshot_path, "w", encoding="utf-8") as f:
+        json.dump({"seq": 2, "events": [{"op": "start", "choices": ["b"]}]}, f)
+    
+    with open(event_log.log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add", "option": 0, "user": 11, "seq": 3}) + "\n")
+    
+    loaded = run(VoteEventLog(tmp_path, "1").load())
+    assert [event["op"] for event in loaded] == ["start", "add"]
+    assert loaded[0]["choices"] == ["b"] and loaded[1]["user"] == 11
+
+def test_opened_log_numbers_events_after_snapshot(tmp_path):
+    event_log = VoteEventLog(tmp_path, "1")
+    event_log.set_snapshot_source(lambda: [{"op": "start", "choices": ["a"]}])
+    appended(event_log, [{"op": "add", "option": 0, "user": uid} for uid in range(5)])
+    run(event_log.compact())
+    
+    # A new vote in a new process, its events have to come after the old snapshot's
+    reopened = VoteEventLog(tmp_path, "1")
+    run(reopened.open())
+    appended(reopened, [{"op": "start", "choices": ["b"]}, {"op": "add", "option": 0, "user": 10}])
+    
+    loaded = run(VoteEventLog(tmp_path, "1").load())
+    assert [event["op"] for event in loaded] == ["start", "start", "add"]
+    assert loaded[-2]["choices"] == ["b"]
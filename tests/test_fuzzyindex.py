@@ -0,0 +1,23 @@
+from movie_night.fuzzyindex import FuzzyIndex
+
+def test_find_duplicate_ignores_case_and_spacing():
+    index = FuzzyIndex(["The Thing"])
+    assert index.find_duplicate("  the   THING ") == "The Thing"
+    assert index.find_duplicate("The Thing 2") is None
+
+def test_removing_one_of_several_duplicates_keeps_the_rest():
+    # Lists saved before duplicates were caught can hold the same title more than once
+    index = FuzzyIndex(["Alien", "alien", "Aliens"])
+    index.remove("Alien")
+    assert index.find_duplicate("ALIEN") == "alien"
+    
+    index.remove("alien")
+    assert index.find_duplicate("ALIEN") is None
+    assert index.find_duplicate("aliens") == "Aliens"
+
+def test_search_finds_closest_title():
+    index = FuzzyIndex(["Alien", "The Thing", "Jaws"])
+    assert index.search("the thng") == "The Thing"
+    
+    index.remove("The Thing")
+    assert index.search("the thng") is None
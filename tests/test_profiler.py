@@ -0,0 +1,30 @@
+import asyncio
+
+from movie_night.profiler import CogProfiler, profiled
+
+class Background:
+    @profiled
+    async def _run(self):
+        await asyncio.sleep(0.05)
+
+def test_background_tasks_and_await_time_are_reported():
+    profiler = CogProfiler()
+    
+    @profiler.wrap
+    async def listener():
+        await asyncio.ensure_future(Background()._run())
+    
+    profiler.start()
+    asyncio.get_event_loop().run_until_complete(listener())
+    report = profiler.stop()
+    
+    assert "Background._run" in report and "listener" in report
+    
+    times = profiler._times["Background._run"]
+    assert times.calls == 1 and times.wall >= 0.05 and times.awaiting() > times.running
+
+def test_nothing_is_reported_while_stopped():
+    profiler = CogProfiler()
+    asyncio.get_event_loop().run_until_complete(Background()._run())
+    
+    assert profiler.stop() is None and profiler._times == {}
@@ -0,0 +1,78 @@
+from movie_night.ranked_choice import ballot_matrix, borda, instant_runoff
+from movie_night.tally import VoteTally
+
+def make_tally(num_options, ballots):
+    """Builds a tally from (user id, [options, most preferred first]), each user's votes arriving in order"""
+    tally = VoteTally()
+    for _ in range(num_options):
+        tally.add_option()
+    
+    for uid, prefs in ballots:
+        for option in prefs:
+            tally.add(option, uid)
+    
+    return tally
+
+# 4 voters A > B > C, 3 voters B > C > A, 2 voters C > B > A
+A, B, C = 0, 1, 2
+ELECTION = [(uid, [A, B, C]) for uid in range(4)] + [(uid, [B, C, A]) for uid in range(4, 7)] + [(uid, [C, B, A]) for uid in range(7, 9)]
+
+def test_ballot_matrix_keeps_each_users_order():
+    tally = make_tally(3, [(10, [C, A]), (11, [B])])
+    ballots = ballot_matrix(tally)
+    
+    assert ballots.shape == (2, 3)
+    assert ballots[0, C] < ballots[0, A] and ballots[0, B] == 0
+    assert ballots[1, B] > 0 and ballots[1, A] == 0 and ballots[1, C] == 0
+
+def test_ballot_matrix_drops_empty_ballots():
+    tally = make_tally(2, [(10, [A]), (11, [B])])
+    tally.remove(A, 10)
+    
+    assert ballot_matrix(tally).shape == (1, 2)
+
+def test_ballot_matrix_handles_options_added_later():
+    tally = make_tally(2, [(10, [A]), (11, [B])])
+    late = tally.add_option()
+    tally.add(late, 11)
+    
+    ballots = ballot_matrix(tally)
+    assert ballots.shape == (2, 3)
+    assert ballots[0, late] == 0 and ballots[1, late] > ballots[1, B]
+
+def test_ballot_matrix_cleared_option():
+    tally = make_tally(2, [(10, [A, B]), (11, [A])])
+    tally.clear_option(A)
+    
+    ballots = ballot_matrix(tally)
+    assert ballots.shape == (1, 2)
+    assert ballots[0, A] == 0 and ballots[0, B] > 0
+
+def test_instant_runoff_transfers_eliminated_votes():
+    # A leads the first round, C is eliminated and its votes go to B
+    assert instant_runoff(ballot_matrix(make_tally(3, ELECTION))) == ([B], 5)
+
+def test_instant_runoff_first_round_majority():
+    ballots = [(uid, [A]) for uid in range(3)] + [(3, [B, A])]
+    assert instant_runoff(ballot_matrix(make_tally(2, ballots))) == ([A], 3)
+
+def test_instant_runoff_tie():
+    ballots = [(0, [A, B]), (1, [B, A])]
+    assert instant_runoff(ballot_matrix(make_tally(2, ballots))) == ([A, B], 1)
+
+def test_instant_runoff_no_ballots():
+    assert instant_runoff(ballot_matrix(make_tally(3, []))) == ([A, B, C], 0)
+
+def test_borda_known_election():
+    # A: 4 * 2 = 8, B: 4 * 1 + 3 * 2 + 2 * 1 = 12, C: 3 * 1 + 2 * 2 = 7
+    assert borda(ballot_matrix(make_tally(3, ELECTION))) == ([B], 12)
+
+def test_borda_partial_ballots_only_score_ranked_options():
+    assert borda(ballot_matrix(make_tally(3, [(0, [B])]))) == ([B], 2)
+
+def test_borda_tie():
+    ballots = [(0, [A, B]), (1, [B, A])]
+    assert borda(ballot_matrix(make_tally(2, ballots))) == ([A, B], 1)
+
+def test_borda_no_ballots():
+    assert borda(ballot_matrix(make_tally(3, []))) == ([A, B, C], 0)
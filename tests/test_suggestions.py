@@ -0,0 +1,21 @@
+import pytest
+
+from movie_night.suggestions import dump_suggestions, parse_suggestions
+
+def test_json_titles_and_objects():
+    data = b'["Alien", {"title": "  The   Thing "}, {"year": 1982}, "", 5]'
+    assert list(parse_suggestions(data, "list.json")) == ["Alien", "The Thing"]
+
+@pytest.mark.parametrize("data", [b'"Alien"', b'{"Alien": 1}', b'5', b'null'])
+def test_json_must_be_a_list(data):
+    with pytest.raises(ValueError):
+        list(parse_suggestions(data, "list.JSON"))
+
+def test_csv_skips_header_and_blank_rows():
+    data = "title,year\nAlien,1979\n\n  ,\nThe Thing,1982\n".encode("utf-8")
+    assert list(parse_suggestions(data, "list.csv")) == ["Alien", "The Thing"]
+
+@pytest.mark.parametrize("fmt", ["json", "csv"])
+def test_export_round_trip(fmt):
+    titles = ["Alien", "Amélie", "Title, with a comma"]
+    assert list(parse_suggestions(dump_suggestions(titles, fmt), f"list.{fmt}")) == titles
@@ -0,0 +1,37 @@
+from movie_night.votecache import VoteInfoCache
+
+class Vote:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+    
+    def is_voting_enabled(self):
+        return self.enabled
+
+def test_least_recently_used_are_evicted():
+    evicted = []
+    cache = VoteInfoCache(max_size=2, on_evict=lambda key, vinfo: evicted.append(key))
+    cache[1] = Vote()
+    cache[2] = Vote()
+    cache.get(1)
+    cache[3] = Vote()
+    
+    assert evicted == [2]
+    assert 1 in cache and 3 in cache and 2 not in cache
+    assert cache.evictions == 1
+
+def test_ongoing_votes_are_kept():
+    evicted = []
+    cache = VoteInfoCache(max_size=1, on_evict=lambda key, vinfo: evicted.append(key))
+    cache[1] = Vote(enabled=True)
+    cache[2] = Vote()
+    
+    assert evicted == [] and len(cache) == 2
+
+def test_idle_votes_are_evicted():
+    evicted = []
+    cache = VoteInfoCache(idle_timeout=-1.0, on_evict=lambda key, vinfo: evicted.append((key, vinfo)))
+    vinfo = Vote()
+    cache[(1, "poll")] = vinfo
+    
+    assert cache.evict() == 1
+    assert evicted == [((1, "poll"), vinfo)]